@@ -0,0 +1,118 @@
+# Content hash manifest of the uncompressed VCRDCI avi datasets.
+#    VCRDCI_matlab_check.py only compares file names, so a truncated or corrupted avi goes unnoticed.
+#    This script writes "manifest_name" into each path in "avi_path_list", with one row per avi:
+#        file     <folder>\<file>, as in the dataset spreadsheets
+#        size     size in bytes
+#        mtime    modification time in nanoseconds
+#        hash     blake2b hash of the file contents
+#    Files are hashed in parallel, streaming "block_size" bytes at a time.  When a manifest already exists,
+#    only files whose size or modification time changed (or that are new) are hashed again.  Files that
+#    cannot be read are reported and left out of the manifest, so the next run tries them again.
+#    To validate a copy, update the manifest on both machines and compare them:
+#        python VCRDCI_avi_manifest.py compare <source manifest> <copy manifest>
+
+import os
+import sys
+import hashlib
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+
+
+avi_path_list = ['D:\\VCRDCI_matlab_data', 'E:\\VCRDCI_matlab_data', 'I:\\VCRDCI_matlab_data']   #drives hosting the uncompressed dataset
+manifest_name = 'VCRDCI_avi_manifest.csv'
+hash_workers = 8                    #number of files hashed in parallel
+block_size = 16 * 1024 * 1024       #bytes read per block
+
+
+def hash_file(file_path):
+
+    #returns None if the file cannot be read, the other files are still hashed
+    digest = hashlib.blake2b()
+    buffer = bytearray(block_size)
+    view = memoryview(buffer)
+    try:
+        with open(file_path, 'rb', buffering=0) as f:
+            while True:
+                count = f.readinto(buffer)                  #reuse one buffer for the whole file
+                if count == 0:
+                    break
+                digest.update(view[:count])
+    except OSError as error:
+        print('cannot hash', file_path, ':', error)
+        return None
+    return digest.hexdigest()
+
+
+def scan_avi(avi_path):
+
+    files = []
+    with os.scandir(avi_path) as folders:
+        for folder in folders:
+            if folder.is_dir():
+                with os.scandir(folder.path) as entries:
+                    for entry in entries:
+                        if entry.name.endswith('.avi') and entry.is_file():
+                            stat = entry.stat()
+                            files.append((folder.name + "\\" + entry.name, stat.st_size, stat.st_mtime_ns))
+    return pd.DataFrame(files, columns=['file', 'size', 'mtime'])
+
+
+def update_manifest(avi_path):
+
+    manifest_file = os.path.join(avi_path, manifest_name)
+    current = scan_avi(avi_path)
+
+    if os.path.isfile(manifest_file):                       #reuse hashes of files with unchanged size and mtime
+        previous = pd.read_csv(manifest_file, dtype={'file': str, 'size': 'int64', 'mtime': 'int64', 'hash': str})
+        current = current.merge(previous, on=['file', 'size', 'mtime'], how='left')
+    else:
+        current['hash'] = None
+
+    stale = current['hash'].isna()
+    print(avi_path, ':', stale.sum(), 'of', len(current), 'avi files to hash')
+    file_paths = [os.path.join(avi_path, *file.split("\\")) for file in current.loc[stale, 'file']]
+    with ThreadPoolExecutor(max_workers=hash_workers) as pool:     #hashlib releases the GIL while hashing
+        current.loc[stale, 'hash'] = list(pool.map(hash_file, file_paths))
+
+    failed = current['hash'].isna()
+    if failed.any():                                        #left out, hashed again by the next run
+        print(avi_path, ':', failed.sum(), 'avi files skipped, not in the manifest')
+        current = current[~failed]
+
+    current.sort_values('file').to_csv(manifest_file + '.tmp', index=False)
+    os.replace(manifest_file + '.tmp', manifest_file)       #an interrupted run keeps the old manifest
+    return current
+
+
+def compare_manifests(source_file, copy_file):
+
+    source = pd.read_csv(source_file, dtype={'file': str, 'hash': str})
+    copy = pd.read_csv(copy_file, dtype={'file': str, 'hash': str})
+    both = source.merge(copy, on='file', how='outer', suffixes=('_source', '_copy'), indicator=True)
+
+    report = pd.concat([
+        both.loc[both['_merge'] == 'left_only', ['file']].assign(problem='missing_in_copy'),
+        both.loc[both['_merge'] == 'right_only', ['file']].assign(problem='extra_in_copy'),
+        both.loc[(both['_merge'] == 'both') & (both['size_source'] != both['size_copy']), ['file']].assign(problem='size_differs'),
+        both.loc[(both['_merge'] == 'both') & (both['size_source'] == both['size_copy'])
+                 & (both['hash_source'] != both['hash_copy']), ['file']].assign(problem='hash_differs'),
+    ], ignore_index=True)
+    return report
+
+
+def main():
+
+    if len(sys.argv) == 4 and sys.argv[1] == 'compare':
+        report = compare_manifests(sys.argv[2], sys.argv[3])
+        print(report.to_string(index=False) if len(report) > 0 else 'copy matches the source manifest')
+        return
+
+    for avi_path in avi_path_list:
+        if os.path.isdir(avi_path):
+            update_manifest(avi_path)
+        else:
+            print('bad directory path', avi_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -16,14 +16,13 @@
 
 #to properly run, the machine calling this script must have access to ffmpeg in the path,
 #or must be running this script from the same path as ffmpeg.exe
-#the python module FFprobe is used in the error checking algorithm
+#the error checking algorithm (VCRDCI_integrity_check.py) calls ffprobe, which must also be in the path
 
 import time
 import json
 from json import JSONDecodeError
 import os
-from ffprobe import FFProbe
-from ffprobe.exceptions import FFProbeError
+from VCRDCI_integrity_check import validate_folder
 
 
 path = "C:\\Users\\rgrosso\\Documents\\Media\\VCRDCI_source_video" #path to source video
@@ -34,11 +33,11 @@ avi_file_path_1 = 'D:\\VCRDCI_matlab_data' #path to drive hosting uncompressed d
 avi_file_path_2 = 'E:\VCRDCI_matlab_data' #path to drive hosting uncompressed dataset
 avi_file_path_3 = 'I:\\VCRDCI_matlab_data' #path to drive hosting uncompressed dataset
 
-res_list = ['1920x1080', '1280x720', \              #list of resolutions used in the VCRDCI dataset. 
-            '960x540', '768x432', '640x360', \      #resolutions can be added or removed when generating further data
+res_list = ['1920x1080', '1280x720',               #list of resolutions used in the VCRDCI dataset. 
+            '960x540', '768x432', '640x360',        #resolutions can be added or removed when generating further data
             '512x288', '384x216', '320x180']        
 
-crf_list =  ['0', '18', '19', '20', '22', \         #list of constant rate factors used in the VCRDCI dataset
+crf_list =  ['0', '18', '19', '20', '22',           #list of constant rate factors used in the VCRDCI dataset
             '25', '27', '30', '35', '40']           #CRF valuse can be added or removed when generating further data
 
 encoder_list = ['h.264', 'h.265', 'av1']            #list of encoders used in VCRDCI dataset
@@ -145,7 +144,8 @@ def scene_matrix(folder):
                 for crf in crf_list:  #iterate through all CRF values
                     for encoding in encoder_list:  #iterate through encoder list
                         dump_file_name, ffmpeg_setting, options = dump_file(crf, res, encoding, file_fields)   #forumulate distorted file in accordance with VCRDCI naming convention
-                        command = "ffmpeg -i \"" + path + "\\" + folder + "\\" + file \                        #formulate the command string
+                        #formulate the command string
+                        command = "ffmpeg -i \"" + path + "\\" + folder + "\\" + file \
                                   + "\" -c:v " + ffmpeg_setting + " -pix_fmt yuv420p " + options \
                                   + "-crf " + crf + " -vf scale=" + res + " -c:a copy \"" \
                                   + dump_path + "\\" + file_name + "\\" + dump_file_name + ".mp4\""
@@ -194,7 +194,8 @@ def fullHD_convert(sub_path):
             
         
             ffmpeg_setting, options = fullHD_dump_file(file_fields)                #formulate ffmpeg settings
-            command = "ffmpeg -i \"" + sub_path + "\\" + file \                    #formulate ffmpeg command string
+            #formulate ffmpeg command string
+            command = "ffmpeg -i \"" + sub_path + "\\" + file \
                       + "\" -c:v " + ffmpeg_setting + " -pix_fmt yuv420p " + options \
                       + "-crf 0 -vf scale=1920x1080 -c:a copy \"" \
                       + sub_path + "\\" + file_name + "_fullHD.mp4\""
@@ -204,49 +205,9 @@ def fullHD_convert(sub_path):
 
 
 def error_check(check_path,sub_path,folder):
-    #get original file frames
-    files = os.listdir(sub_path)  #list files in sub_path
-    min_file_size = 2000          #min file size 2 kB, anything smaller is likely encoded incorrectly
-    original_file = folder + '.mp4'  #source file string formulated from the folder string
-    
-    command = check_path + '\\' + folder + '\\' + original_file  #formulate original file path string
-    
-    metadata=FFProbe(command)  #get metadata of original file
-
-    for stream in metadata.streams:   #iterate through streams in original file
-        if stream.is_video():         #select streams that are video
-             print('Original Stream contains {} frames. '.format(stream.frames()) + folder)  #print number of frames in original video
-             original_file_frames = stream.frames()                                          #set the variable to compare other encodings against
-             
-    for file in files:                              #iterate through files in sub_path
-        if '.mp4' in file and 'Original' not in file:    #select all .mp4 videos for error checking
-                      
-           #check for file size
-           if os.path.getsize(sub_path + "\\" + file) >=  min_file_size:  #if the file size is greater than min_file_size
-               pass                                                       #do nothing
-           else:
-               os.remove(sub_path + "\\" + file)                            #remove the file
-               print(file)                                                  #print the deleted file
-
-           #ffprobe error check
-           command = sub_path + '\\' + file                  #formulate file path
-           
-           metadata=FFProbe(command)                         #probe the file
-           
-           if len(metadata.streams) == 0:                    #if no meta data comes up, delete the file
-               print(file + '   bad copy, deleting')
-               os.remove(sub_path + "\\" + file)
-           for stream in metadata.streams:                   #iterate through streams and check for equal number of frames
-               try:
-                   if stream.is_video():
-                       
-                       if stream.frames() < original_file_frames:
-                           print(file + '   bad copy, deleting')
-                           os.remove(sub_path + "\\" + file)       #delete the bad file
-               except FFProbeError as e:                            #catch other FFprobe errors and delete the file if any errors
-                   print(e)
-                   os.remove(sub_path + "\\" + file)      
-                   
+    #tiered check of all encodings against the original file frames, bad files are quarantined
+    files = [file for file in os.listdir(sub_path) if '.mp4' in file and 'Original' not in file]   #select all .mp4 videos for error checking
+    validate_folder(sub_path, folder + '.mp4', files)                                                #see VCRDCI_integrity_check.py
 
            
             
@@ -263,7 +224,8 @@ def convert_avi(avi_dump_path,sub_path):
             file_name = file.replace('.mp4','')                                   #remove .mp4 tag
             
             #matlab wants uyvy422 encoded avi
-            command = "ffmpeg -i \"" + sub_path + "\\" + file \                   #formulate .avi encoding command
+            #formulate .avi encoding command
+            command = "ffmpeg -i \"" + sub_path + "\\" + file \
                       + "\" -c:v rawvideo -pix_fmt uyvy422 -vtag uyvy " \
                       + "-c:a copy \"" \
                       + avi_dump_path + "\\" + file_name + ".avi\""
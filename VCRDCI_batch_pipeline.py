@@ -0,0 +1,221 @@
+# asyncio version of the per-file loop in VCRDCI_batch_rate.py main().
+#    VCRDCI_batch_rate.py runs decode, vmaf rating and yuv deletion one file at a time, so the CPU idles
+#    while ffmpeg writes a yuv to disk and the disk idles while vmaf rates.  This script runs the same work
+#    as four stages connected by queues, so different files are in different stages at the same time:
+#        decode     ffmpeg writes the source yuv (once per folder) and the variant yuv
+#        rate       vmaf rates the variant yuv against the source yuv (backend from VCRDCI_batch_rate.py)
+#        summary    builds the binary per-frame store and summary (VCRDCI_vmaf_store.py)
+#        cleanup    deletes the variant yuv, the source yuv is kept as in VCRDCI_batch_rate.py
+#    At most "max_pending_yuv" variant yuv files exist at any time, and the queues between stages hold at most
+#    "max_pending_yuv" jobs; the decoders wait for cleanup to free a slot.  A job that fails in any stage is
+#    logged and its yuv deleted, so the file is rated on the next run.
+#    Settings (path, vmaf backend, threads) are taken from VCRDCI_batch_rate.py.  The error check of
+#    VCRDCI_batch_rate.py is not part of this pipeline; run it afterwards.
+
+import os
+import time
+import asyncio
+from subprocess import DEVNULL
+import VCRDCI_batch_rate as batch_rate
+from VCRDCI_vmaf_store import convert_json
+
+
+decode_workers = 2              #number of ffmpeg decodes running at once
+rate_workers = 2                #number of vmaf ratings running at once, each uses batch_rate.vmaf_threads threads
+max_pending_yuv = 4             #maximum number of decoded variant yuv files on disk at any time
+
+
+async def run_command(command):
+
+    if isinstance(command, str):                                        #python backend is a shell command string
+        process = await asyncio.create_subprocess_shell(command, stdin=DEVNULL, stdout=DEVNULL, stderr=DEVNULL)
+    else:
+        process = await asyncio.create_subprocess_exec(*command, stdin=DEVNULL, stdout=DEVNULL, stderr=DEVNULL)
+    return await process.wait()                                         #return code, 0 if the command succeeded
+
+
+def remove_file(file):
+
+    try:
+        os.remove(file)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print('could not delete', file, ':', e)
+
+
+def list_jobs():
+
+    jobs = []
+    for folder in sorted(os.listdir(batch_rate.path)):                  #list all items in "path"
+        sub_path = batch_rate.path + "/" + folder + "/"
+        if os.path.isdir(sub_path) == False:
+            continue
+        for file in sorted(os.listdir(sub_path)):
+            if '.mp4' in file and 'fullHD' in file:                     #select upconverted files
+                file_name = file.replace('.mp4','')
+                if os.path.isfile(sub_path + file_name + ".json") == False:     #not rated yet
+                    jobs.append({'sub_path': sub_path, 'folder': folder, 'file': file, 'file_name': file_name})
+    return jobs
+
+
+async def decode_source(job, source_locks):
+
+    source_yuv = job['sub_path'] + job['folder'] + ".yuv"
+    async with source_locks.setdefault(job['folder'], asyncio.Lock()):  #decode each source yuv only once
+        if os.path.isfile(source_yuv) == False:
+            remove_file(source_yuv + '.tmp.yuv')                        #left over from an interrupted run
+            start = time.time()
+            command = ['ffmpeg', '-y', '-nostdin', '-i', job['sub_path'] + job['folder'] + '.mp4', '-pix_fmt', 'yuv420p', source_yuv + '.tmp.yuv']
+            if await run_command(command) != 0:
+                print('source decode failed:', source_yuv)
+                return False
+            os.replace(source_yuv + '.tmp.yuv', source_yuv)             #a partial decode never looks like a finished yuv
+            batch_rate.record_timing('source_decode', job['folder'] + '.mp4', start)
+    return True
+
+
+async def decode_job(job, source_locks):
+
+    yuv_file = job['sub_path'] + job['file_name'] + ".yuv"
+    remove_file(yuv_file)                                               #left over from an interrupted run
+    start = time.time()
+    command = ['ffmpeg', '-y', '-nostdin', '-i', job['sub_path'] + job['file'], '-pix_fmt', 'yuv420p', yuv_file]
+    if await decode_source(job, source_locks) and await run_command(command) == 0:
+        batch_rate.record_timing('variant_decode', job['file'], start)
+        return True
+    return False
+
+
+async def decode_stage(job_queue, rate_queue, yuv_slots, source_locks):
+
+    while True:
+        job = await job_queue.get()
+        await yuv_slots.acquire()                                       #backpressure, wait for cleanup to free a slot
+        try:
+            decoded = await decode_job(job, source_locks)
+        except Exception as e:                                          #e.g. ffmpeg not found, disk errors
+            print(e)
+            decoded = False
+        try:
+            if decoded:
+                await rate_queue.put(job)
+            else:
+                print('decode failed:', job['file'])
+                remove_file(job['sub_path'] + job['file_name'] + ".yuv")
+                yuv_slots.release()
+        finally:
+            job_queue.task_done()
+
+
+async def rate_job(job):
+
+    original_file = job['sub_path'] + job['folder'] + ".yuv"
+    yuv_file = job['sub_path'] + job['file_name'] + ".yuv"
+    json_file = job['sub_path'] + job['file_name'] + ".json"
+
+    start = time.time()
+    if batch_rate.vmaf_backend == 'native':
+        native_file = json_file.replace('.json','.native.json')
+        return_code = await run_command(batch_rate.vmaf_native_command(original_file, yuv_file, native_file))
+        if return_code == 0:
+            await asyncio.to_thread(batch_rate.vmaf_native_to_json, native_file, json_file)
+    else:
+        return_code = await run_command(batch_rate.vmaf_python_command(original_file, yuv_file, json_file))
+
+    if return_code == 0 and os.path.isfile(json_file):
+        batch_rate.record_timing('vmaf_rate', job['file'], start)
+        return True
+    return False
+
+
+async def rate_stage(rate_queue, summary_queue, cleanup_queue):
+
+    while True:
+        job = await rate_queue.get()
+        try:
+            rated = await rate_job(job)
+        except Exception as e:                                          #e.g. corrupt native json, vmaf not found
+            print(e)
+            rated = False
+        try:
+            if rated:
+                await summary_queue.put(job)
+            else:
+                print('vmaf failed:', job['file'])
+                await cleanup_queue.put(job)                            #delete the yuv, the file is rated on the next run
+        finally:
+            rate_queue.task_done()
+
+
+async def summary_stage(summary_queue, cleanup_queue):
+
+    while True:
+        job = await summary_queue.get()
+        try:
+            await asyncio.to_thread(convert_json, job['sub_path'] + job['file_name'] + ".json")
+        except Exception as e:                                          #corrupt json is caught later by json_check
+            print('summary failed:', job['file'], e)
+        try:
+            await cleanup_queue.put(job)
+        finally:
+            summary_queue.task_done()
+
+
+async def cleanup_stage(cleanup_queue, yuv_slots):
+
+    while True:
+        job = await cleanup_queue.get()
+        try:
+            remove_file(job['sub_path'] + job['file_name'] + ".yuv")     #does not delete source yuv
+        finally:
+            yuv_slots.release()
+            cleanup_queue.task_done()
+
+
+async def join_queue(queue, workers):
+
+    joined = asyncio.create_task(queue.join())
+    await asyncio.wait([joined] + workers, return_when=asyncio.FIRST_COMPLETED)
+    for worker in workers:
+        if worker.done():                                               #workers only stop on an unexpected error
+            joined.cancel()
+            raise RuntimeError('pipeline worker stopped') from worker.exception()
+
+
+async def run_pipeline(jobs):
+
+    job_queue = asyncio.Queue()
+    rate_queue = asyncio.Queue(maxsize=max_pending_yuv)                 #bounded, a full queue pauses the stage before it
+    summary_queue = asyncio.Queue(maxsize=max_pending_yuv)
+    cleanup_queue = asyncio.Queue(maxsize=max_pending_yuv)
+    yuv_slots = asyncio.Semaphore(max_pending_yuv)
+    source_locks = {}
+
+    for job in jobs:
+        job_queue.put_nowait(job)
+
+    workers = [asyncio.create_task(decode_stage(job_queue, rate_queue, yuv_slots, source_locks)) for n in range(decode_workers)] \
+            + [asyncio.create_task(rate_stage(rate_queue, summary_queue, cleanup_queue)) for n in range(rate_workers)] \
+            + [asyncio.create_task(summary_stage(summary_queue, cleanup_queue)),
+               asyncio.create_task(cleanup_stage(cleanup_queue, yuv_slots))]
+
+    #wait for each stage to drain in pipeline order, then stop the workers
+    try:
+        for queue in [job_queue, rate_queue, summary_queue, cleanup_queue]:
+            await join_queue(queue, workers)
+    finally:
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+
+def main():
+
+    jobs = list_jobs()
+    print(len(jobs), 'files to rate')
+    asyncio.run(run_pipeline(jobs))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+# Dry run planner for VCRDCI_batch_rate.py.  Nothing is converted, rated or deleted.
+#    Walks the folder tree in "path" once and builds the job graph that VCRDCI_batch_rate.py would run:
+#        source_decode    original mp4 to yuv (kept until the folder is finished)
+#        variant_decode   fullHD mp4 to yuv, needs no other job
+#        vmaf_rate        needs source_decode and variant_decode of the same folder
+#        delete_yuv       needs vmaf_rate, frees the variant yuv
+#        validate         ffprobe error check of each folder, needs all ratings of that folder
+#    Jobs whose outputs already exist are dropped.  The remaining jobs are replayed in the order
+#    VCRDCI_batch_rate.py runs them to find the peak scratch disk needed for yuv files.
+#    Wall time is estimated from the mean run time of each job type recorded in "timing_file".
+
+import os
+import csv
+from VCRDCI_batch_rate import path, timing_file
+from VCRDCI_integrity_check import original_frames
+
+
+frame_bytes = 1920 * 1080 * 3 // 2              #size of one yuv420p 1920x1080 frame
+plan_workers = [1, 2, 4, 8]                     #number of parallel workers to forecast wall time for
+job_types = ['source_decode', 'variant_decode', 'vmaf_rate', 'delete_yuv', 'validate']
+
+
+def folder_frames(sub_path, folder):
+
+    frames = original_frames(sub_path + folder + '.mp4')        #all files of a folder have the frame count of the original
+    if frames is None:
+        return 0                                                #unknown, yuv sizes of this folder are not counted
+    return frames
+
+
+def folder_jobs(sub_path, folder):
+
+    files = os.listdir(sub_path)                                #list the folder once
+    frames = folder_frames(sub_path, folder)
+    jobs = []
+
+    source_yuv = sub_path + folder + '.yuv'
+    source_job = {'job': 'source_decode', 'name': folder + '.yuv', 'bytes': frames * frame_bytes, 'depends': []}
+    rate_names = []
+
+    for file in files:
+        if '.mp4' in file and 'fullHD' in file:                 #same selection as yuv_convert and vmaf_convert
+            file_name = file.replace('.mp4','')
+            if os.path.isfile(sub_path + file_name + '.json'):  #already rated, nothing to do for this file
+                continue
+            if source_job not in jobs and not os.path.isfile(source_yuv):
+                jobs.append(source_job)
+            jobs.append({'job': 'variant_decode', 'name': file_name + '.yuv', 'bytes': frames * frame_bytes, 'depends': []})
+            jobs.append({'job': 'vmaf_rate', 'name': file_name + '.json', 'bytes': 0,
+                         'depends': [folder + '.yuv', file_name + '.yuv']})
+            jobs.append({'job': 'delete_yuv', 'name': file_name + '.yuv.delete', 'bytes': -frames * frame_bytes,
+                         'depends': [file_name + '.json']})
+            rate_names.append(file_name + '.json')
+
+    jobs.append({'job': 'validate', 'name': folder + '.validate', 'bytes': 0, 'depends': rate_names})
+    return jobs
+
+
+def read_timings():
+
+    timings = {}
+    if not os.path.isfile(timing_file):
+        return timings
+    with open(timing_file, newline='') as f:
+        for row in csv.reader(f):                               #job type, file, seconds
+            if len(row) == 3:
+                timings.setdefault(row[0], []).append(float(row[2]))
+    return {job: sum(seconds) / len(seconds) for job, seconds in timings.items()}
+
+
+def plan():
+
+    jobs = []
+    scratch = 0                                                 #yuv bytes already on disk
+    for folder in sorted(os.listdir(path)):                     #walk the folder tree once
+        sub_path = path + "/" + folder + "/"
+        if os.path.isdir(sub_path):
+            for file in os.listdir(sub_path):
+                if file.endswith('.yuv'):
+                    scratch += os.path.getsize(sub_path + file)
+            jobs.extend(folder_jobs(sub_path, folder))
+
+    #replay the pending jobs in run order to find the peak scratch disk requirement
+    current = scratch
+    peak = scratch
+    for job in jobs:
+        current += job['bytes']
+        peak = max(peak, current)
+
+    largest = max([job['bytes'] for job in jobs if job['job'] == 'variant_decode'] + [0])
+    return jobs, scratch, peak, largest
+
+
+def main():
+
+    jobs, scratch, peak, largest = plan()
+    timings = read_timings()
+
+    print('Pending jobs:', len(jobs))
+    total_seconds = 0
+    for job_type in job_types:
+        count = len([job for job in jobs if job['job'] == job_type])
+        if job_type in timings:
+            seconds = count * timings[job_type]
+            total_seconds += seconds
+            print('  {:15s} {:7d} jobs  {:8.1f} hours  ({:.1f} s per job)'.format(job_type, count, seconds / 3600, timings[job_type]))
+        else:
+            print('  {:15s} {:7d} jobs  no recorded timing'.format(job_type, count))
+
+    print('Scratch disk in use: {:.1f} GB'.format(scratch / 1e9))
+    print('Peak scratch disk:   {:.1f} GB ({:.1f} GB more than in use)'.format(peak / 1e9, (peak - scratch) / 1e9))
+    for workers in plan_workers:                                #each extra worker holds one more variant yuv
+        print('Estimated wall time with {} workers: {:.1f} hours, peak scratch disk {:.1f} GB'.format(
+              workers, total_seconds / workers / 3600, (peak + (workers - 1) * largest) / 1e9))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,35 @@
 # This script was run on a linux computer with netflix vmaf suite installed at the home folder.
-#    Converts mp4 files of differing formats to yuv.  Python's interface to ffprobe 
-#    was installed to check for files that failed to convert correctly.
+#    Converts mp4 files of differing formats to yuv.  ffprobe is called by VCRDCI_integrity_check.py
+#    to check for files that failed to convert correctly.
+#    VMAF ratings are computed by the backend named in "vmaf_backend":
+#        'native' calls the multithreaded libvmaf command line tool "vmaf_exe" with "vmaf_threads" threads
+#        'python' starts VMAF's python wrapper run_vmaf.py (one python interpreter per rating)
+#    Both backends write the run_vmaf.py json layout (frames list plus aggregate block with VMAF_score)
+#    Each json is then converted into a binary per-frame store and summary, see VCRDCI_vmaf_store.py
 
 import os
 import time
+import json
+from json import JSONDecodeError
+import subprocess
 from subprocess import CalledProcessError
-from ffprobe import FFProbe
-from ffprobe.exceptions import FFProbeError
+from VCRDCI_vmaf_store import convert_json
+from VCRDCI_integrity_check import validate_folder
 
 path = "/media/rgrosso/Aegis_DT/ffmpeg_test_cuts"
 vmaf_path = "~/vmaf"
+vmaf_backend = "native"                                 # "native" or "python", see vmaf_backends
+vmaf_exe = "vmaf"                                       # libvmaf command line tool, must be in the path or a full path
+vmaf_threads = 8                                        # number of threads used by the native vmaf backend
 error_check_folder = None                               # Example folder: "VCRDCI_128000_4k.from.SVT_Dnc.Prty_h.264_Original_Highest"
+timing_file = path + "/batch_timing.csv"                # per job run times, used by VCRDCI_batch_plan.py to forecast a run
+
+
+def record_timing(job, file, start):
+
+    with open(timing_file, 'a') as f:                    #append one line per finished job: job type, file, seconds
+        f.write(job + ',' + file + ',' + str(round(time.time() - start, 3)) + '\n')
+
 
 def original_yuv_convert(sub_path,file):
        
@@ -20,12 +39,15 @@ def original_yuv_convert(sub_path,file):
         
         print(file_name)
               
-        command = "ffmpeg -i " + sub_path + file \      #formulate command for original yuv
+        #formulate command for original yuv
+        command = "ffmpeg -i " + sub_path + file \
                   + "  -pix_fmt yuv420p -c:a copy " \
                   + sub_path + file_name
                   
         if yuv_exists == False:                         #check original yuv logical 
+            start = time.time()
             os.system(command)                          #execute command 
+            record_timing('source_decode', file, start)
              
 
  
@@ -53,17 +75,90 @@ def yuv_convert(sub_path,file,folder):
         
         
         	
-        command = "ffmpeg -i " + sub_path + file \            #formulate yuv conversion command string
+        #formulate yuv conversion command string
+        command = "ffmpeg -i " + sub_path + file \
                   + "  -pix_fmt yuv420p -c:a copy " \
                   + sub_path + file_name + ".yuv"
                   
                   
                   
         if yuv_exists == False and json_exists == False:      #check that the json is absent and the yuv does not exist
+            start = time.time()
             os.system(command)                                #send the command to the os for execution
+            record_timing('variant_decode', file, start)
              
             
                                   
+def vmaf_score_name(metric):
+
+    #libvmaf names the vmaf model output 'vmaf' and the features e.g. 'integer_adm2',
+    #run_vmaf.py names them 'VMAF_score' and e.g. 'VMAF_feature_adm2_score'
+    if metric == 'vmaf':
+        return 'VMAF_score'
+    return 'VMAF_feature_' + metric.replace('integer_','') + '_score'
+
+
+def vmaf_python_command(original_file, distorted_file, json_file):
+
+    return "cd '" + vmaf_path + "'; \
+            PYTHONPATH=python '" + vmaf_path + "/python/vmaf/script/run_vmaf.py' \
+            yuv420p 1920 1080 '" + original_file + "' '" + distorted_file \
+            + "' --out-fmt json --out-file '" + json_file + "'"                       #formulate command string to call vmaf according to vmaf github
+
+
+def vmaf_python(original_file, distorted_file, json_file):
+
+    command = vmaf_python_command(original_file, distorted_file, json_file)
+    print(command)
+    os.system(command)                                                                #send the command to the os for execution
+
+
+def vmaf_native_command(original_file, distorted_file, native_file):
+
+    return [vmaf_exe,
+            '--reference', original_file,
+            '--distorted', distorted_file,
+            '--width', '1920', '--height', '1080',
+            '--pixel_format', '420', '--bitdepth', '8',
+            '--threads', str(vmaf_threads),
+            '--json', '--output', native_file]                                       #formulate the libvmaf command line
+
+
+def vmaf_native_to_json(native_file, json_file):
+
+    with open(native_file) as f:
+        data = json.load(f)
+
+    frames = []
+    for frame in data['frames']:                                                      #per frame scores
+        record = {'frameNum': frame['frameNum']}
+        for metric, value in frame['metrics'].items():
+            record[vmaf_score_name(metric)] = value
+        frames.append(record)
+
+    aggregate = {}
+    for metric, pooled in data['pooled_metrics'].items():                            #mean pooled scores
+        aggregate[vmaf_score_name(metric)] = pooled['mean']
+    aggregate['method'] = 'mean'
+
+    with open(json_file + '.tmp', 'w') as f:                                          #write to a temporary file so an interrupted
+        json.dump({'frames': frames, 'aggregate': aggregate}, f)                     #run never leaves a partial json behind
+    os.replace(json_file + '.tmp', json_file)
+    os.remove(native_file)
+
+
+def vmaf_native(original_file, distorted_file, json_file):
+
+    native_file = json_file.replace('.json','.native.json')                          #libvmaf output, converted to json_file below
+    command = vmaf_native_command(original_file, distorted_file, native_file)
+    print(' '.join(command))
+    subprocess.run(command, check=True)                                               #raises CalledProcessError if vmaf fails
+    vmaf_native_to_json(native_file, json_file)
+
+
+vmaf_backends = {'python': vmaf_python, 'native': vmaf_native}                        #rating backends selectable with vmaf_backend
+
+
 def vmaf_convert(sub_path,file,folder):
     
     
@@ -78,17 +173,20 @@ def vmaf_convert(sub_path,file,folder):
         original_exists = os.path.isfile(original_file)                                       #check for yuv encoding of source video
         json_exists = os.path.isfile(sub_path+file_name+".json")                              #check for json file 
         
-        command = "cd '" + vmaf_path + "'; \
-                   PYTHONPATH=python '" + vmaf_path + "/python/vmaf/script/run_vmaf.py' \
-                   yuv420p 1920 1080 '" + original_file + "' '" + sub_path + file_name \
-                   + ".yuv' --out-fmt json --out-file '" + sub_path + file_name + ".json'"    #formulate command string to call vmaf according to vmaf github
-        
         if distorted_exists == True and original_exists == True and json_exists == False:     #check if the file needs rating
+            rate_file = vmaf_backends[vmaf_backend]                                           #select the configured vmaf backend
             try:
-                os.system(command)                                                            #send the command to the os for execution
-            except as e:                print(e)
+                start = time.time()
+                rate_file(original_file, sub_path+file_name+".yuv", sub_path+file_name+".json")
+                record_timing('vmaf_rate', file, start)
+            except (CalledProcessError, OSError) as e:
+                print(e)
                 os.remove(sub_path+file_name+".yuv")                                          #handle errors, delete yuv file
-            print(command)
+            if os.path.isfile(sub_path+file_name+".json"):
+                try:
+                    convert_json(sub_path+file_name+".json")                                  #build the binary per-frame store and summary
+                except (JSONDecodeError, KeyError) as e:                                      #corrupt json is caught later by json_check
+                    print(e)
             time.sleep(1)
         	
             	
@@ -110,44 +208,9 @@ def delete_yuv(sub_path,file):
 
 def error_check(sub_path,folder):
 
-     files = os.listdir(sub_path)                                     #list all items in sub_path
-     original_file = folder + '.mp4'                                  #fomrulate original file string
-     command = path + "/" + folder + "/" + original_file              #formulate command string
-     
-     metadata = FFProbe(command)                                      #extract metadata
-     
-     for stream in metadata.streams:                                  #iterate through streams in file
-        if stream.is_video():                                         #if the stream is a video stream
-             print('Original Stream contains {} frames. '.format(stream.frames()) + folder)
-             original_file_frames = stream.frames()                   #set the original stream frame count
-             
-     for file in files:                                               #iterate through files
-         if '.mp4' in file and 'Original' not in file:                #select source files
-             min_file_size = 2000                                     #set min file size 2kB
-           
-
-             #ffprobe error check
-             command = sub_path + '/' + file                          #formulate command string
-           
-             metadata=FFProbe(command)                                #probe metadata
-             if os.path.getsize(command) < min_file_size:             #compare file size
-                 print(file + '   bad copy, deleting')
-                 os.remove(command)                                   #delete file
-                 
-             if len(metadata.streams) == 0:                           #if there are no streams, file is bad
-                     print(file + '   bad copy, deleting')
-                     os.remove(command)                               #delete file
-                     
-             for stream in metadata.streams:                          #iterate through streams
-                 try:
-                     if stream.is_video():                            #if the stream is a video
-                         #print(file + ' Stream contains {} frames.'.format(stream.frames()))
-                         if stream.frames() < original_file_frames:   #compare number of frames
-                             print(file + '   bad copy, deleting')
-                             os.remove(command)                       #remove file if less frames than original
-                 except FFProbeError as e:                            #catch exceptions
-                     print(e)
-                     os.remove(command)                               #delete file if it throws an error
+     #tiered check of all encodings against the original file frames, bad files are quarantined
+     files = [file for file in os.listdir(sub_path) if '.mp4' in file and 'Original' not in file]  #select encoded files
+     validate_folder(sub_path, folder + '.mp4', files)                                               #see VCRDCI_integrity_check.py
 
 def main():
     
@@ -175,14 +238,16 @@ def main():
     for folder in folders:                             #iterate through all items in "folders"
        sub_path = path + "/" + folder                  #formulate sub path
        if os.path.isdir(sub_path):                     #check if sub path exists
+           start = time.time()
            error_check(sub_path,folder)                #call error check function
+           record_timing('validate', folder, start)
     
     
     #error check one folder
     if not error_check_folder is None:
         sub_path = path + "/" + error_check_folder
         if os.path.isdir(sub_path):
-            error_check(sub_path, folder)
+            error_check(sub_path, error_check_folder)
          
 if __name__ == "__main__":
     while True:   #continuously loop until killed
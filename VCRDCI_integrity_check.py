@@ -0,0 +1,139 @@
+# Tiered integrity check for the encoded VCRDCI mp4 files, used by the error_check functions of
+#    VCRDCI_batch_convert.py and VCRDCI_batch_rate.py.
+#    Each file is compared against the frame count of the original video with the cheapest test that can decide:
+#        size      files smaller than min_file_size are bad
+#        header    ffprobe reads the container header; good if it reports at least the original frame count
+#        packets   ffprobe counts the video packets without decoding; good if there are at least the original frame count
+#        decode    only files that failed the cheaper tiers are fully decoded; good if every frame decodes without an
+#                  error level message (warnings are ignored)
+#    Files are checked in parallel.  Bad files are moved into a "quarantine" sub folder instead of being deleted,
+#    so the encode is redone but the bad copy can still be inspected.  The results of every file are written to
+#    integrity_report.csv in the checked folder.
+#    ffprobe and ffmpeg must be in the path.
+
+import os
+import csv
+import json
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+
+min_file_size = 2000                    #min file size 2 kB, anything smaller is likely encoded incorrectly
+check_workers = 8                       #number of files checked in parallel
+quarantine_folder = 'quarantine'        #sub folder that bad files are moved into
+report_name = 'integrity_report.csv'    #report written into each checked folder
+
+
+def run_probe(arguments):
+
+    result = subprocess.run(['ffprobe', '-v', 'error'] + arguments, capture_output=True, text=True)
+    if result.returncode != 0:                                          #unreadable file
+        return None
+    try:
+        return json.loads(result.stdout)
+    except ValueError:
+        return None
+
+
+def probe_header(file):
+
+    data = run_probe(['-select_streams', 'v:0', '-show_entries', 'stream=nb_frames', '-of', 'json', file])
+    if data is None or len(data.get('streams', [])) == 0:             #no readable video stream
+        return None
+    nb_frames = data['streams'][0].get('nb_frames')
+    if nb_frames is None or not str(nb_frames).isdigit():              #frame count missing from the container
+        return 0
+    return int(nb_frames)
+
+
+def count_packets(file):
+
+    data = run_probe(['-select_streams', 'v:0', '-count_packets', '-show_entries', 'stream=nb_read_packets', '-of', 'json', file])
+    if data is None or len(data.get('streams', [])) == 0:
+        return None
+    return int(data['streams'][0].get('nb_read_packets', 0))
+
+
+def count_decoded_frames(file):
+
+    #decode every frame, any decoder error marks the file as bad; warnings are not printed, and the
+    #level prefix keeps anything else ffprobe writes to stderr from counting as an error
+    result = subprocess.run(['ffprobe', '-v', 'level+error', '-select_streams', 'v:0', '-count_frames',
+                             '-show_entries', 'stream=nb_read_frames', '-of', 'json', file],
+                            capture_output=True, text=True)
+    errors = [line for line in result.stderr.splitlines() if '[error]' in line or '[fatal]' in line or '[panic]' in line]
+    if result.returncode != 0 or len(errors) > 0:
+        return None
+    try:
+        data = json.loads(result.stdout)
+        return int(data['streams'][0].get('nb_read_frames', 0))
+    except (ValueError, KeyError, IndexError):
+        return None
+
+
+def original_frames(file):
+
+    frames = probe_header(file)
+    if frames == 0:                                                    #not in the header, count packets instead
+        frames = count_packets(file)
+    return frames
+
+
+def check_file(sub_path, file, expected_frames):
+
+    file_path = os.path.join(sub_path, file)
+    result = {'file': file, 'tier': 'size', 'status': 'bad', 'frames': '', 'expected': expected_frames}
+
+    if os.path.getsize(file_path) < min_file_size:
+        return result
+
+    result['tier'] = 'header'
+    frames = probe_header(file_path)
+    if frames is not None and frames >= expected_frames:
+        result['status'], result['frames'] = 'good', frames
+        return result
+
+    result['tier'] = 'packets'
+    frames = count_packets(file_path)
+    if frames is not None and frames >= expected_frames:
+        result['status'], result['frames'] = 'good', frames
+        return result
+
+    result['tier'] = 'decode'
+    frames = count_decoded_frames(file_path)
+    if frames is not None and frames >= expected_frames:
+        result['status'] = 'good'
+    result['frames'] = '' if frames is None else frames
+    return result
+
+
+def quarantine(sub_path, file):
+
+    quarantine_path = os.path.join(sub_path, quarantine_folder)
+    if os.path.isdir(quarantine_path) == False:
+        os.mkdir(quarantine_path)
+    os.replace(os.path.join(sub_path, file), os.path.join(quarantine_path, file))   #move, replacing an older bad copy
+
+
+def validate_folder(sub_path, original_file, files):
+
+    expected_frames = original_frames(os.path.join(sub_path, original_file))    #frame count every encoding must reach
+    if expected_frames is None:
+        print(original_file, 'original file is not readable, skipping', sub_path)
+        return []
+    print('Original Stream contains {} frames. '.format(expected_frames) + original_file)
+
+    with ThreadPoolExecutor(max_workers=check_workers) as pool:                  #ffprobe runs in separate processes
+        results = list(pool.map(lambda file: check_file(sub_path, file, expected_frames), files))
+
+    for result in results:                                                       #move bad files only after all checks finished
+        if result['status'] == 'bad':
+            print(result['file'] + '   bad copy (' + result['tier'] + '), quarantining')
+            quarantine(sub_path, result['file'])
+
+    with open(os.path.join(sub_path, report_name), 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['file', 'tier', 'status', 'frames', 'expected'])
+        writer.writeheader()
+        writer.writerows(results)
+
+    return results
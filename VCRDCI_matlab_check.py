@@ -1,65 +1,82 @@
-# Remove all files in "avi_path" that are not part of current "VCRDCI_3.xlsx" spreadsheet.  Also, print the original and truncated file list to the console.
+# Compare the files in "avi_path" with the current "VCRDCI_3.xlsx" spreadsheet.  Nothing is deleted.
+#    The folders of "avi_path" and "raw_json_path" are scanned in parallel, then the spreadsheet entries
+#    and the files on disk are compared as sets.  The report lists every file with a problem:
+#        missing_avi      in the MOS sheet, no .avi on disk
+#        extra_avi        .avi on disk, not in the MOS sheet
+#        zero_size_avi    .avi on disk with size 0
+#        missing_json     in the MOS sheet, no vmaf .json in raw_json_path
+#        zero_size_json   vmaf .json with size 0
+#        missing_mos      in the MOS sheet without a vmaf rating (NaN raw_mos), highlights any straggling errors
+#    The report is printed as a summary and written to "report_file".
 
 import os
 import time
 import json
 from json import JSONDecodeError
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from VCRDCI_workbook import load_workbook
 
 
 avi_path = "I:\\VCRDCI_matlab_data"
 raw_json_path = "D:\\VCRDCI_dataset"
+report_file = "VCRDCI_matlab_check_report.csv"  #structured report of all problems found
+scan_workers = 16                               #number of folders scanned in parallel
+
+
+def scan_folder(root, folder, extension):
+
+    files = {}
+    with os.scandir(os.path.join(root, folder)) as entries:
+        for entry in entries:
+            if entry.name.endswith(extension) and entry.is_file():
+                files[folder + "\\" + entry.name] = entry.stat().st_size   #same <folder>\<file> form as the spreadsheet
+    return files
+
+
+def scan_tree(root, extension):
+
+    with os.scandir(root) as entries:
+        folders = [entry.name for entry in entries if entry.is_dir()]
+    files = {}
+    with ThreadPoolExecutor(max_workers=scan_workers) as pool:
+        for folder_files in pool.map(lambda folder: scan_folder(root, folder, extension), folders):
+            files.update(folder_files)
+    return files                                #dictionary of file to size in bytes
+
+
+def reconcile(mos_sheet):
+
+    sheet_files = set(mos_sheet['file'].dropna())
+    avi_files = scan_tree(avi_path, '.avi')
+    json_files = scan_tree(raw_json_path, '.json')
+    sheet_json = {file: file.replace('.avi', '.json') for file in sheet_files}
+
+    problems = [(file, 'missing_avi') for file in sheet_files - avi_files.keys()] \
+             + [(file, 'extra_avi') for file in avi_files.keys() - sheet_files] \
+             + [(file, 'zero_size_avi') for file, size in avi_files.items() if size == 0] \
+             + [(json_file, 'missing_json') for json_file in set(sheet_json.values()) - json_files.keys()] \
+             + [(json_file, 'zero_size_json') for json_file in sheet_json.values() if json_files.get(json_file) == 0] \
+             + [(file, 'missing_mos') for file in mos_sheet.loc[mos_sheet['raw_mos'].isna(), 'file'].dropna()]
+
+    return pd.DataFrame(problems, columns=['file', 'problem']).sort_values(['problem', 'file'], ignore_index=True)
 
 
-  
-    
 def main():
-    
+
     #import the spreadsheet
     spreadsheet_name = 'VCRDCI_3.xlsx'
     spreadsheet_path = os.path.join(avi_path, spreadsheet_name)
-    category_sheet = pd.read_excel(spreadsheet_path,sheet_name = 'Category')
-    category_list_sheet = pd.read_excel(spreadsheet_path,sheet_name = 'Category_list')
-    category_name_sheet = pd.read_excel(spreadsheet_path,sheet_name = 'Category_name')
-    mos_sheet = pd.read_excel(spreadsheet_path,sheet_name = 'MOS')
-    read_sheet = pd.read_excel(spreadsheet_path,sheet_name = 'Read')
-    format_sheet = pd.read_excel(spreadsheet_path,sheet_name = 'Format')
-    dataset_sheet = pd.read_excel(spreadsheet_path,sheet_name = 'Dataset')
-    #create dictionary of excel sheets that we will call a workbook
-    workbook_dir = {'Category':category_sheet , 'Category_list':category_list_sheet, 'Category_name':category_name_sheet, \
-                    'MOS':mos_sheet,'Read':read_sheet, 'Format':format_sheet, 'Dataset':dataset_sheet} 
-
-    all_files = []
-    folders = os.listdir(avi_path)
-    for folder in folders:
-        sub_path = avi_path + "\\" + folder
-        if os.path.isdir(sub_path) == True:
-            files = os.listdir(sub_path)
-            for file in files:
-                file_sub_path = folder + "\\" + file
-                all_files.append(file_sub_path)
-    print(all_files)
-    
-    #only need to view mos sheet, iterate through all rows
-    for index,row in mos_sheet.iterrows():
-
-        #formulate path of json file containing vmaf rating
-        json_file_name = row['file'].replace('.avi', '.json')
-        json_path = os.path.join(raw_json_path, json_file_name)
-        
-        #print(scene_number)
-        try:
-            print(row['file'])
-            
-            all_files.remove(row['file'])
-        except ValueError as e:
-            print(json_path,"extra or missing file")
-            print(e)
-        
-        
-    print(all_files)  #print the files that are absent from the matlab dataset. this means the avi file was not opened, not readable or corrupt
-                      #check matlab dataset for all vmaf ratings by searching for NaN in the mos sheet. This will highlight any straggling errors 
-    
-    
+    workbook_dir = load_workbook(spreadsheet_path)                  #dictionary of all excel sheets that we will call a workbook, parsed once and cached
+    mos_sheet = workbook_dir['MOS']
+
+    #only need to view mos sheet
+    report = reconcile(mos_sheet)
+    print(len(mos_sheet), 'files in the MOS sheet')
+    print(report['problem'].value_counts().to_string() if len(report) > 0 else 'no problems found')
+    report.to_csv(report_file, index=False)
+    print('report written to', report_file)
+
+
 if __name__ == '__main__':
     main()
@@ -6,67 +6,87 @@ import os
 import time
 import json
 from json import JSONDecodeError
+import numpy as np
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from VCRDCI_vmaf_store import read_aggregate
+from VCRDCI_workbook import load_workbook, update_workbook
 
 
 avi_path = "I:\\VCRDCI_matlab_data"
 raw_json_path = "D:\\VCRDCI_dataset"
+ingest_workers = 16                  #number of json files read in parallel
+stage_updates = False                #True stages changed cells next to the workbook, merge them with VCRDCI_workbook.py
+mos_mapping = 'linear'               #mapping of raw vmaf ratings to the ACR scale, a key of mos_mappings
+logistic_midpoint = 50               #raw vmaf rating mapped to the middle of the ACR scale (3) by the logistic mapping
+logistic_slope = 0.1                 #steepness of the logistic mapping at logistic_midpoint
+
+
+def read_raw_vmaf(json_path):
+
+    #check if the file exists, and if it does, read only its aggregate block
+    if os.path.isfile(json_path) == False:
+        return np.nan                                   #if the file doesnt exist, the rating is NaN
+    try:
+        return float(read_aggregate(json_path)['VMAF_score'])
+    except (OSError, IndexError, TypeError, JSONDecodeError, KeyError, ValueError) as e:
+        print(e, json_path, '- reading the full json')  #corrupt summary or truncated tail
+    try:
+        with open(json_path) as f:
+            return float(json.load(f)['aggregate']['VMAF_score'])
+    except (OSError, TypeError, JSONDecodeError, KeyError, ValueError) as e:
+        print(e, json_path)
+        return np.nan
+
+
+def read_raw_vmaf_column(json_paths):
+
+    with ThreadPoolExecutor(max_workers=ingest_workers) as pool:   #file reads overlap, order of json_paths is kept
+        return np.array(list(pool.map(read_raw_vmaf, json_paths)), dtype=np.float64)
+
+
+# f(x) = k*x + b            #formula to calculate scaling of MOS values to ACR
+# x = 0, f(x) = 1
+# k = f(x)/ x + b/x
+# x = 100, f(x) = 5
+# k = 5/100 + 1/100 = 4/100
+def mos_linear(raw_vmaf):
+
+    return (raw_vmaf * (4/100)) + 1
+
+
+def mos_clipped(raw_vmaf):
+
+    return np.clip(mos_linear(raw_vmaf), 1, 5)          #vmaf ratings below 0 or above 100 stay on the ACR scale
+
+
+def mos_logistic(raw_vmaf):
+
+    return 1 + 4 / (1 + np.exp(-logistic_slope * (raw_vmaf - logistic_midpoint)))
+
+
+mos_mappings = {'linear': mos_linear, 'clipped': mos_clipped, 'logistic': mos_logistic}   #each maps a float64 array, NaN stays NaN
+
 
-   
-    
 def main():
     
     #import the spreadsheet
     spreadsheet_name = 'VCRDCI_3.xlsx'     #can be VCRDCI_1.xlsx or VCRDCI_2.xlsx
     spreadsheet_path = os.path.join(avi_path, spreadsheet_name)                                         #formulate path to spreadsheet in question
-    category_sheet = pd.read_excel(spreadsheet_path,sheet_name = 'Category')                            #each sheet in a workbook is imported as a separate variable
-    category_list_sheet = pd.read_excel(spreadsheet_path,sheet_name = 'Category_list')                  #import Category_list
-    category_name_sheet = pd.read_excel(spreadsheet_path,sheet_name = 'Category_name')                  #import Category_name
-    mos_sheet = pd.read_excel(spreadsheet_path,sheet_name = 'MOS')                                      #import MOS
-    read_sheet = pd.read_excel(spreadsheet_path,sheet_name = 'Read')                                    #import read
-    format_sheet = pd.read_excel(spreadsheet_path,sheet_name = 'Format')                                #import format
-    dataset_sheet = pd.read_excel(spreadsheet_path,sheet_name = 'Dataset')                              #import dataset
-    #create dictionary of excel sheets that we will call a workbook
-    workbook_dir = {'Category':category_sheet , 'Category_list':category_list_sheet, 'Category_name':category_name_sheet, \  #create a dictionary of the sheets in the workbook
-                    'MOS':mos_sheet,'Read':read_sheet, 'Format':format_sheet, 'Dataset':dataset_sheet} 
-
-    #only need to change mos sheet, iterate through all rows
-    for index,row in mos_sheet.iterrows():
-
-        #formulate path of json file containing vmaf rating
-        json_file_name = row['file'].replace('.avi', '.json')
-        json_path = os.path.join(raw_json_path, json_file_name)
-        
-        #check if the file exists, and if it does, open it, read it and insert the vmaf rating into the mos spreadsheet structure
-        if os.path.isfile(json_path) == True:
-            try:
-                f = open(json_path)
-                data = json.load(f)
-                raw_vmaf = data['aggregate']['VMAF_score']
-                #mos_sheet.at[index,'raw_mos'] = raw_vmaf
-                # f(x) = k*x + b            #formula to calculate scaling of MOS values to ACR
-                # x = 0, f(x) = 1
-                # k = f(x)/ x + b/x
-                # x = 100, f(x) = 5
-                # k = 5/100 + 1/100 = 4/100
-                mos_sheet.at[index,'mos'] = (raw_vmaf * (4/100)) + 1
-                mos_sheet.at[index,'raw_mos'] = raw_vmaf
-                
-            except JSONDecodeError as e:
-                print(e,index,json_file_name)
-                mos_sheet.at[index,'mos'] = 'NaN'
-                mos_sheet.at[index,'raw_mos'] = 'NaN'
-                
-        else:
-            # if the file doesnt exist, put a NaN in the mos sheet structure
-            mos_sheet.at[index,'raw_mos'] = 'NaN'
-            mos_sheet.at[index,'mos'] = 'NaN'
-
-    #use same spreadsheet        
-          
-    writer = pd.ExcelWriter(spreadsheet_path, engine='xlsxwriter')                    #instance of ExcelWriter
-    for sheet_label in workbook_dir.keys():                                           #iterate through all sheets in the workbook
-        workbook_dir[sheet_label].to_excel(writer,sheet_name=sheet_label,index=False)
-    writer.save()                                                                     #save the file
+    workbook_dir = load_workbook(spreadsheet_path)                  #dictionary of all excel sheets that we will call a workbook, parsed once and cached
+    mos_sheet = workbook_dir['MOS']
+    original_dir = {sheet_label: sheet.copy() for sheet_label, sheet in workbook_dir.items()}   #unchanged copy, to find the changed cells
+
+    #only need to change mos sheet, read the vmaf rating of every row in parallel
+    json_paths = [os.path.join(raw_json_path, file.replace('.avi', '.json')) for file in mos_sheet['file']]   #formulate paths of json files containing vmaf ratings
+    raw_vmaf = read_raw_vmaf_column(json_paths)
+
+    #whole columns at once, missing or unreadable json files are NaN in both
+    mos_sheet['raw_mos'] = raw_vmaf
+    mos_sheet['mos'] = mos_mappings[mos_mapping](raw_vmaf).astype(np.float64)
+
+    #use same spreadsheet, only written if a cell changed
+    update_workbook(spreadsheet_path, workbook_dir, original_dir, stage=stage_updates)
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,125 @@
+# Converts VMAF .json ratings into a compact binary per-frame store and a small summary file.
+#    The run_vmaf.py / libvmaf json files contain one record per frame and are large and slow to parse.
+#    Each json is converted once into:
+#        <name>.frames.npy       float32 matrix, one contiguous row per column ('frameNum' first, then each metric)
+#        <name>.summary.json     column names, number of frames and the aggregate block of the json
+#    Ingestion (VCRDCI_vmaf_data_to_matlab.py) only reads the summary.  Per-frame analyses call
+#    load_frames(), which memory maps the matrix so only the columns that are used are read from disk.
+#    The original json is kept; the store is rebuilt whenever the json is newer than the summary.
+#    read_aggregate() returns the aggregate block of a json without parsing its per-frame records,
+#    from the summary if there is one, otherwise from the end of the json where both vmaf backends write it.
+
+import os
+import json
+from json import JSONDecodeError
+import numpy as np
+
+
+raw_json_path = "D:\\VCRDCI_dataset"       #folder tree holding the vmaf json files
+
+
+def store_files(json_file):
+
+    file_name = json_file[:-len('.json')]                                   #remove .json tag
+    return file_name + '.frames.npy', file_name + '.summary.json'           #return frame store and summary file names
+
+
+def convert_json(json_file):
+
+    frames_file, summary_file = store_files(json_file)
+
+    if os.path.isfile(summary_file) and os.path.isfile(frames_file) \
+       and os.path.getmtime(summary_file) >= os.path.getmtime(json_file):  #store is up to date
+        return False
+
+    with open(json_file) as f:
+        data = json.load(f)
+
+    columns = ['frameNum']                                                  #frame index is always the first column
+    for frame in data['frames']:
+        for name in frame.keys():
+            if name not in columns:
+                columns.append(name)
+
+    frames = np.full((len(columns), len(data['frames'])), np.nan, dtype=np.float32)
+    for fcnt, frame in enumerate(data['frames']):
+        for ccnt, name in enumerate(columns):
+            if name in frame:
+                frames[ccnt, fcnt] = frame[name]
+
+    summary = {'columns': columns, 'frames': len(data['frames']), 'aggregate': data['aggregate']}
+
+    #write to temporary files first, so an interrupted conversion never leaves a partial store behind
+    with open(frames_file + '.tmp', 'wb') as f:
+        np.save(f, frames)
+    with open(summary_file + '.tmp', 'w') as f:
+        json.dump(summary, f)
+    os.replace(frames_file + '.tmp', frames_file)
+    os.replace(summary_file + '.tmp', summary_file)                         #summary last, it marks the store as complete
+    return True
+
+
+def read_summary(json_file):
+
+    frames_file, summary_file = store_files(json_file)
+
+    if not os.path.isfile(summary_file):                                    #no summary, caller falls back to the json
+        return None
+    if os.path.isfile(json_file) and os.path.getmtime(json_file) > os.path.getmtime(summary_file):
+        return None                                                         #json was re-rated after the summary was written
+    with open(summary_file) as f:
+        return json.load(f)
+
+
+def read_aggregate(json_file, block_size=65536):
+
+    summary = read_summary(json_file)
+    if summary is not None:
+        return summary['aggregate']
+
+    with open(json_file, 'rb') as f:
+        size = f.seek(0, os.SEEK_END)
+        f.seek(max(size - block_size, 0))                                   #aggregate is normally at the end of the file
+        tail = f.read().decode('utf-8', errors='ignore')
+        key = tail.rfind('"aggregate"')
+        if key >= 0:
+            value = tail.index(':', key) + 1
+            while tail[value].isspace():
+                value += 1
+            aggregate, end = json.JSONDecoder().raw_decode(tail, value)     #parse only the aggregate object
+            return aggregate
+
+        f.seek(0)                                                           #unusual layout, parse the whole file
+        return json.load(f)['aggregate']
+
+
+def load_frames(json_file, columns=None):
+
+    frames_file, summary_file = store_files(json_file)
+    summary = read_summary(json_file)
+    if summary is None:
+        return None
+
+    frames = np.load(frames_file, mmap_mode='r')                            #memory map, nothing is read yet
+    if columns is None:
+        columns = summary['columns']
+    return {name: frames[summary['columns'].index(name)] for name in columns}   #dictionary of column name to frame values
+
+
+def main():
+
+    converted = 0
+    for root, dirs, files in os.walk(raw_json_path):                        #walk all folders in raw_json_path
+        for file in files:
+            if file.endswith('.json') and not file.endswith('.summary.json') \
+               and not file.endswith('.native.json'):                       #select vmaf json files
+                try:
+                    if convert_json(os.path.join(root, file)):
+                        converted += 1
+                except (JSONDecodeError, KeyError) as e:                    #corrupt or incomplete json, leave it for json_check
+                    print(e, "skipping:", os.path.join(root, file))
+    print("converted", converted, "json files")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+# Loading and incremental updates of the VCRDCI dataset workbooks (VCRDCI_n.xlsx) used by
+#    VCRDCI_vmaf_data_to_matlab.py, VCRDCI_category_data.py and VCRDCI_matlab_check.py.
+#    load_workbook() parses all sheets with one pass over the xlsx and caches the result in a pickle
+#    next to the workbook (<workbook>.cache.pkl).  The cache is used while the workbook's modification
+#    time and size are unchanged, and is deleted whenever this module writes the workbook.
+#    Columns are typed the same way on every load:
+#        file                              text, on every sheet
+#        mos, sos, raw_mos, raw_sos, jnd   float64 on the MOS sheet, empty cells and 'NaN' text are NaN
+#        Category1..Category8              text on the Category and Category_list sheets, empty cells are NaN
+#    update_workbook() compares the edited sheets with the sheets as they were read and
+#        - does nothing if no cell changed
+#        - with stage=True, appends the changed cells to a sidecar file next to the workbook
+#          (<workbook>.staged.pkl) instead of rewriting the xlsx; a cell already staged with the
+#          same value is not a change, and a cell staged again replaces its earlier value; changes
+#          are found against the xlsx, so staged cells a run does not set are kept
+#        - otherwise rewrites the workbook once, with the staged cells merged in (the cells of the
+#          run win) and the sidecar file deleted
+#        - refuses to rewrite a workbook whose rows or columns changed while cells are staged,
+#          merge_staged() has to run first
+#    Staged cells are merged into the xlsx on demand with merge_staged(), or from the command line:
+#        python VCRDCI_workbook.py D:\VCRDCI_matlab_data\VCRDCI_1.xlsx
+
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+
+sheet_names = ['Category', 'Category_list', 'Category_name', 'MOS', 'Read', 'Format', 'Dataset']   #sheets in the order export_dataset.m writes them
+category_columns = ['Category' + str(cnt) for cnt in range(1, 9)]
+text_columns = {'Category': ['file'] + category_columns, 'Category_list': category_columns}   #other sheets only type 'file'
+float_columns = {'MOS': ['mos', 'sos', 'raw_mos', 'raw_sos', 'jnd']}
+cache_version = 2                   #changes when the typing of columns changes, older caches are reparsed
+
+
+def cache_file(spreadsheet_path):
+
+    return spreadsheet_path + '.cache.pkl'
+
+
+def type_columns(sheet, sheet_label):
+
+    for column in sheet.columns:
+        if column in float_columns.get(sheet_label, []):
+            sheet[column] = pd.to_numeric(sheet[column], errors='coerce').astype(np.float64)
+        elif column in text_columns.get(sheet_label, ['file']):
+            sheet[column] = sheet[column].map(lambda value: value if pd.isna(value) else str(value)).astype(object)
+    return sheet
+
+
+def load_workbook(spreadsheet_path):
+
+    stat = os.stat(spreadsheet_path)
+    key = (cache_version, stat.st_mtime_ns, stat.st_size)                              #workbook version the cache belongs to
+
+    if os.path.isfile(cache_file(spreadsheet_path)):
+        cache = pd.read_pickle(cache_file(spreadsheet_path))
+        if cache['key'] == key:
+            return cache['sheets']
+
+    sheets = pd.read_excel(spreadsheet_path, sheet_name=sheet_names)                    #one pass over the xlsx for all sheets
+    workbook_dir = {sheet_label: type_columns(sheets[sheet_label], sheet_label) for sheet_label in sheet_names}
+    pd.to_pickle({'key': key, 'sheets': workbook_dir}, cache_file(spreadsheet_path))
+    return workbook_dir
+
+
+def staged_file(spreadsheet_path):
+
+    return spreadsheet_path + '.staged.pkl'
+
+
+def diff_sheet(old, new):
+
+    #return the changed cells as a data frame (row, column, value), or None if rows or columns were added or removed
+    if list(old.columns) != list(new.columns) or len(old) != len(new):
+        return None
+
+    changes = []
+    for column in new.columns:
+        old_values = old[column].to_numpy(dtype=object)
+        new_values = new[column].to_numpy(dtype=object)
+        same = (old_values == new_values) | (pd.isna(old_values) & pd.isna(new_values))   #NaN in both is not a change
+        for row in np.flatnonzero(~same):
+            changes.append((row, column, new_values[row]))
+    return pd.DataFrame(changes, columns=['row', 'column', 'value'])
+
+
+def write_workbook(spreadsheet_path, workbook_dir):
+
+    if os.path.isfile(cache_file(spreadsheet_path)):
+        os.remove(cache_file(spreadsheet_path))                                        #the next load parses the new xlsx
+
+    with pd.ExcelWriter(spreadsheet_path, engine='xlsxwriter') as writer:              #instance of ExcelWriter
+        for sheet_label in workbook_dir.keys():                                         #iterate through all sheets in the workbook
+            workbook_dir[sheet_label].to_excel(writer, sheet_name=sheet_label, index=False)
+
+
+def apply_staged(workbook_dir, staged):
+
+    staged = staged.drop_duplicates(['sheet', 'row', 'column'], keep='last')          #the latest update of a cell wins
+    for (sheet_label, column), changes in staged.groupby(['sheet', 'column'], sort=False):
+        sheet = workbook_dir[sheet_label]
+        values = pd.Series(list(changes['value']), index=changes['row'].to_numpy())
+        if sheet[column].dtype != object and values.map(lambda value: isinstance(value, str)).any():
+            sheet[column] = sheet[column].astype(object)                                #text staged into a numeric column
+        sheet.loc[values.index, column] = values
+    return staged
+
+
+def same_value(old, new):
+
+    return (pd.isna(old) and pd.isna(new)) or (not pd.isna(old) and not pd.isna(new) and old == new)   #NaN in both is not a change
+
+
+def update_workbook(spreadsheet_path, workbook_dir, original_dir, stage=False):
+
+    previous = None
+    if os.path.isfile(staged_file(spreadsheet_path)):                                  #cells staged by earlier runs
+        previous = pd.read_pickle(staged_file(spreadsheet_path)).drop_duplicates(['sheet', 'row', 'column'], keep='last')
+
+    staged = []
+    rewrite = False
+    for sheet_label in workbook_dir.keys():
+        changes = diff_sheet(original_dir[sheet_label], workbook_dir[sheet_label])     #cells changed by this run, against the xlsx
+        if changes is None:                                                             #structural change, cannot be staged cell by cell
+            rewrite = True
+        elif len(changes) > 0:
+            changes.insert(0, 'sheet', sheet_label)
+            staged.append(changes)
+    staged = pd.concat(staged, ignore_index=True) if len(staged) > 0 else pd.DataFrame(columns=['sheet', 'row', 'column', 'value'])
+
+    if rewrite and previous is not None:                                                #the staged rows may have moved
+        raise RuntimeError('Cells are staged in ' + staged_file(spreadsheet_path) + ', run merge_staged() before changing the rows or columns of the workbook')
+
+    if previous is not None:                                                            #a cell already staged with the same value is not a change
+        staged_values = {(sheet, row, column): value for sheet, row, column, value in previous.itertuples(index=False)}
+        new = [not ((sheet, row, column) in staged_values and same_value(staged_values[(sheet, row, column)], value))
+               for sheet, row, column, value in staged.itertuples(index=False)]
+        staged = staged[new]
+
+    if rewrite == False and len(staged) == 0:
+        print('No changes, workbook not rewritten:', spreadsheet_path)
+        return False
+
+    if stage and rewrite == False:
+        if previous is not None:                                                        #a cell staged again replaces its earlier value
+            staged = pd.concat([previous, staged], ignore_index=True).drop_duplicates(['sheet', 'row', 'column'], keep='last')
+        staged.to_pickle(staged_file(spreadsheet_path))
+        print('Staged', len(staged), 'changed cells in', staged_file(spreadsheet_path))
+        return True
+
+    if previous is not None:                                                            #the staged cells go into the rewrite, the cells of this run win
+        apply_staged(workbook_dir, pd.concat([previous, staged], ignore_index=True))
+    write_workbook(spreadsheet_path, workbook_dir)
+    if previous is not None:
+        os.remove(staged_file(spreadsheet_path))
+        print('Merged', len(previous), 'staged cells')
+    print('Workbook rewritten:', spreadsheet_path)
+    return True
+
+
+def merge_staged(spreadsheet_path):
+
+    if os.path.isfile(staged_file(spreadsheet_path)) == False:
+        print('Nothing staged for', spreadsheet_path)
+        return False
+
+    workbook_dir = load_workbook(spreadsheet_path)
+    staged = apply_staged(workbook_dir, pd.read_pickle(staged_file(spreadsheet_path)))
+
+    write_workbook(spreadsheet_path, workbook_dir)
+    os.remove(staged_file(spreadsheet_path))
+    print('Merged', len(staged), 'staged cells into', spreadsheet_path)
+    return True
+
+
+if __name__ == '__main__':
+    for spreadsheet_path in sys.argv[1:]:
+        merge_staged(spreadsheet_path)
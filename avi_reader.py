@@ -0,0 +1,388 @@
+############################################################################################
+# Program Name : AVI Reader
+# Description  : Python equivalent of read_avi.m for uncompressed AVI files (uyvy, yuy2,
+#                   yv12, i420, rgb24, rgb32 and 10-bit v210). The RIFF headers and
+#                   frame index are parsed once per file; the file is memory mapped and
+#                   frames are NumPy views of the map, so a read only touches the bytes
+#                   of the requested frames, rows and planes.
+#                   Frame numbers are 1 based and frame ranges inclusive, as in read_avi.m.
+############################################################################################
+
+import os
+import time
+import struct
+import numpy as np
+
+# Codecs read as UYVY by read_avi.m
+UyvyCodecs = [ "uyvy", "ffds", "hdyc", "dib " ]
+
+# YCbCr to RGB, as rgb2ycbcr_double.m and ycbcr2rgb_double.m
+RgbToYcbcr = np.array([ [ 65.481, 128.553, 24.966 ], [ -37.797, -74.203, 112.0 ], [ 112.0, -93.786, -18.214 ] ]) / 255.0
+YcbcrToRgb = np.linalg.inv(RgbToYcbcr)
+
+# Info of files already parsed, keyed by file name, like the persistent info of read_avi.m
+InfoCache = {}
+
+# read_chunk
+#   FOURCC, data offset and data size of the chunk at offset pos
+#
+def read_chunk(data, pos):
+    fourcc, size = struct.unpack_from("<4sI", data, pos)
+    return fourcc.decode("latin-1"), pos + 8, size
+
+# chunks
+#   Chunks between offsets start and stop, as (FOURCC, data offset, data size);
+#   for "LIST" chunks, FOURCC is "LIST <list type>" and the data offset is after the list type
+#
+def chunks(data, start, stop):
+    pos = start
+    while pos + 8 <= stop:
+        fourcc, data_pos, size = read_chunk(data, pos)
+        if fourcc == "LIST" and size >= 4:
+            yield "LIST " + bytes(data[data_pos:data_pos + 4]).decode("latin-1"), data_pos + 4, size - 4
+        else:
+            yield fourcc, data_pos, size
+        pos = data_pos + size + (size & 1)          # chunks are word aligned
+
+# video_compression
+#   VideoCompression of a BITMAPINFOHEADER biCompression, as readBitmapHeader of read_avi.m
+#
+def video_compression(compression):
+    if compression < 4:
+        return [ "none", "8-bit RLE", "4-bit RLE", "bitfields" ][compression]
+    code = struct.pack("<I", compression).decode("latin-1")
+    names = { "none": "None", "rgb ": "None", "raw ": "None", "    ": "None", "rle ": "RLE", "cvid": "Cinepak",
+              "iv32": "Indeo3", "iv50": "Indeo5", "msvc": "MSVC", "cram": "MSVC" }
+    return names.get(code.lower(), code)
+
+# read_standard_index
+#   Frame offsets and sizes of an OpenDML standard index ("ix##" or an "indx" of chunks),
+#   pos is the offset of the index data
+#
+def read_standard_index(data, pos):
+    entries, = struct.unpack_from("<I", data, pos + 4)
+    base_offset, = struct.unpack_from("<Q", data, pos + 12)
+    index = np.frombuffer(data, dtype="<u4", count=2 * entries, offset=pos + 24).reshape(entries, 2)
+    # the top bit of the size flags frames that are not key frames
+    return np.stack([ base_offset + index[:, 0].astype(np.int64), (index[:, 1] & 0x7FFFFFFF).astype(np.int64) ])
+
+# read_super_index
+#   Frame offsets and sizes of an OpenDML "indx" chunk, pos is the offset of the chunk data
+#
+def read_super_index(data, pos):
+    index_type = data[pos + 3]
+    if index_type == 1:                             # index of chunks
+        return read_standard_index(data, pos)
+    entries, = struct.unpack_from("<I", data, pos + 4)
+    frames = []
+    for entry in range(entries):
+        index_offset, = struct.unpack_from("<Q", data, pos + 24 + 16 * entry)
+        frames.append(read_standard_index(data, index_offset + 8))
+    return np.concatenate(frames, axis=1) if len(frames) > 0 else np.zeros((2, 0), dtype=np.int64)
+
+# read_idx1
+#   Frame offsets and sizes from the "idx1" chunk at the end of an AVI 1.0 file
+#
+def read_idx1(data, pos, size, movi_pos, chunk_ids):
+    index = np.frombuffer(data, dtype="<u4", count=size // 4, offset=pos).reshape(-1, 4)
+    ids = np.array([ struct.unpack("<I", chunk_id.encode("latin-1"))[0] for chunk_id in chunk_ids ], dtype=np.uint32)
+    video = index[np.isin(index[:, 0], ids)]
+    frames = np.stack([ video[:, 2].astype(np.int64), video[:, 3].astype(np.int64) ])
+    # offsets may be absolute, or relative to the "movi" list type; AVI readers accept either
+    if frames.shape[1] > 0 and bytes(data[frames[0, 0]:frames[0, 0] + 4]).decode("latin-1") not in chunk_ids:
+        frames[0] += movi_pos
+    frames[0] += 8                                  # skip the chunk header
+    return frames
+
+# scan_movi
+#   Frame offsets and sizes of a file without an index, by walking the "movi" list
+#
+def scan_movi(data, start, stop, chunk_ids):
+    frames = []
+    for fourcc, pos, size in chunks(data, start, stop):
+        if fourcc in chunk_ids:
+            frames.append((pos, size))
+        elif fourcc == "LIST rec ":
+            frames.extend(zip(*scan_movi(data, pos, pos + size, chunk_ids)))
+    return np.array(frames, dtype=np.int64).T.reshape(2, -1)
+
+# parse_avi
+#   Parse the headers and frame index of a memory mapped AVI file
+#
+def parse_avi(data, avi_file):
+    if len(data) < 12 or bytes(data[0:4]) != b"RIFF" or bytes(data[8:12]).lower() != b"avi ":
+        raise ValueError("\"{0}\" is not an avi file".format(avi_file))
+    riff_size, = struct.unpack_from("<I", data, 4)
+    riff_stop = min(8 + riff_size, len(data))
+
+    info = {}
+    avih = None
+    vids = None
+    movi = None
+    idx1 = None
+    for fourcc, pos, size in chunks(data, 12, riff_stop):
+        if fourcc == "LIST hdrl":
+            stream = 0
+            for hdrl_fourcc, hdrl_pos, hdrl_size in chunks(data, pos, pos + size):
+                if hdrl_fourcc == "avih":
+                    total_frames, = struct.unpack_from("<I", data, hdrl_pos + 16)
+                    width, height = struct.unpack_from("<Ii", data, hdrl_pos + 32)
+                    avih = { "NumFrames": total_frames, "Width": width, "Height": abs(height) }
+                elif hdrl_fourcc == "LIST strl":
+                    strl = { name: (strl_pos, strl_size) for name, strl_pos, strl_size in chunks(data, hdrl_pos, hdrl_pos + hdrl_size) }
+                    if "strh" in strl and bytes(data[strl["strh"][0]:strl["strh"][0] + 4]) == b"vids" and vids is None:
+                        vids = dict(strl, stream=stream)
+                    stream += 1
+        elif fourcc == "LIST movi":
+            movi = (pos - 4, pos + size)
+        elif fourcc == "idx1":
+            idx1 = (pos, size)
+    if avih is None or vids is None:
+        raise ValueError("\"{0}\" has no video stream".format(avi_file))
+
+    # stream header
+    strh_pos = vids["strh"][0]
+    codec = bytes(data[strh_pos + 4:strh_pos + 8]).decode("latin-1")
+    scale, rate = struct.unpack_from("<II", data, strh_pos + 20)
+    length, = struct.unpack_from("<I", data, strh_pos + 32)
+
+    # stream format, a BITMAPINFOHEADER
+    strf_pos, strf_size = vids["strf"]
+    header_size, = struct.unpack_from("<I", data, strf_pos)
+    bit_depth, compression = struct.unpack_from("<HI", data, strf_pos + 14)
+    colors_used, = struct.unpack_from("<I", data, strf_pos + 32)
+
+    # frame index: OpenDML super index, else idx1, else a scan of the movi list
+    chunk_ids = [ "{0:02d}db".format(vids["stream"]), "{0:02d}dc".format(vids["stream"]) ]
+    if "indx" in vids:
+        frames = read_super_index(data, vids["indx"][0])
+    elif movi is not None and idx1 is not None:
+        frames = read_idx1(data, idx1[0], idx1[1], movi[0], chunk_ids)
+    elif movi is not None:
+        print("  <No index found in \"{0}\", scanning the frames>".format(avi_file))
+        frames = scan_movi(data, movi[0] + 4, movi[1], chunk_ids)
+    else:
+        raise ValueError("\"{0}\" has no movi list".format(avi_file))
+
+    info["Codec"] = codec
+    info["FramesPerSecond"] = rate / scale if scale > 0 else 0.0
+    # trust the stream header over the main header, unless the main header has more frames (AVIFILE bug)
+    info["NumFrames"] = max(avih["NumFrames"], length)
+    info["Height"] = avih["Height"]
+    info["Width"] = avih["Width"]
+    info["ImageType"] = "indexed" if colors_used > 0 else ("truecolor" if bit_depth > 8 else "grayscale")
+    info["VideoCompression"] = video_compression(compression)
+    info["NumColormapEntries"] = (strf_size - header_size) // 4
+    info["BitDepth"] = bit_depth
+    info["ColorType"] = "RGB" if info["VideoCompression"].lower() == "none" and bit_depth in (24, 32) else "UYVY"
+    info["vidFrames"] = frames
+    return info
+
+# avi_info
+#   Header information of an AVI file, read_avi('Info', avi_file)
+# SYNTAX
+#   info = avi_info(avi_file)
+# SEMANTICS
+#   Returns a dictionary with the fields of read_avi('Info', ...): Filename,
+#   FileModDate, FileSize, Codec, FramesPerSecond, NumFrames, Height, Width,
+#   ImageType, VideoCompression, NumColormapEntries, BitDepth, ColorType and
+#   vidFrames (2 x frames int64 array of the file offset and size of each
+#   frame), plus FileModTime (ns) and Layout (see frame_layout). The info of files read
+#   before is reused while their size and modification time are unchanged.
+#
+def avi_info(avi_file):
+    if os.path.splitext(avi_file)[1] == "":
+        avi_file = avi_file + ".avi"
+    stat = os.stat(avi_file)
+    cached = InfoCache.get(avi_file)
+    if cached is not None and cached["FileSize"] == stat.st_size and cached["FileModTime"] == stat.st_mtime_ns:
+        return cached
+    data = np.memmap(avi_file, dtype=np.uint8, mode="r")
+    info = { "Filename": avi_file, "FileModDate": time.strftime("%d-%b-%Y %H:%M:%S", time.localtime(stat.st_mtime)),
+             "FileSize": stat.st_size, "FileModTime": stat.st_mtime_ns }
+    info.update(parse_avi(data, avi_file))
+    info["Layout"] = frame_layout(info)
+    InfoCache[avi_file] = info
+    return info
+
+# frame_layout
+#   Layout of the frames of an AVI file, from its info
+# SYNTAX
+#   layout = frame_layout(info)
+# SEMANTICS
+#   Returns "uyvy", "yuy2", "yv12", "i420", "v210", "rgb24" or "rgb32", the
+#   layouts read by read_avi.m, or None for other (compressed) codecs.
+#
+def frame_layout(info):
+    if info["ColorType"] == "RGB":
+        return "rgb{0}".format(info["BitDepth"])
+    codec = info["Codec"].lower()
+    if codec in UyvyCodecs:
+        return "uyvy"
+    if codec in ("v210", "yuy2", "i420", "yv12"):
+        return codec
+    return None
+
+# AviFile
+#   Random access to the frames of an uncompressed AVI file
+# SYNTAX
+#   with AviFile(avi_file) as avi:
+#       info      = avi.info
+#       y, cb, cr = avi.read("YCbCr", start, stop, sroi = None, sub128 = False, interp = False)
+#       r, g, b   = avi.read("RGB", start, stop, sroi = None)
+#       y         = avi.read_y(start, stop, sroi = None)
+#       c1, c2, c3 = avi.planes(frame)
+#       y         = avi.y_plane(frame)
+# SEMANTICS
+#   read and read_y return float32 arrays of rows x columns x frames for frames
+#   start to stop (1 based, inclusive, stop defaults to start), like read_avi.m.
+#   sroi is (top, left, bottom, right), 1 based and inclusive, as the 'sroi'
+#   flag of read_avi.m; only the rows of the sroi are read. sub128 subtracts
+#   128 from Cb and Cr, interp interpolates Cb and Cr instead of replicating.
+#   read_y reads only the Y of each frame: the Y plane of yv12 and i420, the
+#   Y bytes of the rows of uyvy and yuy2.
+#   planes returns one frame as read-only views of the memory map, without any
+#   conversion: (Y, Cb, Cr) uint8 at their stored resolution for uyvy, yuy2,
+#   yv12 and i420, (R, G, B) uint8 top row first for rgb24 and rgb32, and
+#   (Y, Cb, Cr) uint16 10-bit values for v210, which are decoded (not views).
+#   y_plane returns the Y of one frame, a uint8 view for the 8-bit YCbCr layouts.
+#   info may be given to skip parsing, e.g. the info of the file in a worker process.
+#
+class AviFile:
+    def __init__(self, avi_file, info = None):
+        self.info = avi_info(avi_file) if info is None else info
+        self.layout = self.info["Layout"]
+        if self.layout is None:
+            raise ValueError("\"{0}\" codec \"{1}\" is not an uncompressed format read by read_avi".format(self.info["Filename"], self.info["Codec"]))
+        self.rows = self.info["Height"]
+        self.cols = self.info["Width"]
+        self.data = np.memmap(self.info["Filename"], dtype=np.uint8, mode="r")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.data = None                            # the map is released when the last view is released
+
+    def frame_bytes(self, frame, row_bytes):
+        if frame < 1 or frame > min(self.info["NumFrames"], self.info["vidFrames"].shape[1]):
+            raise IndexError("frame {0} of \"{1}\" does not exist".format(frame, self.info["Filename"]))
+        offset, size = self.info["vidFrames"][:, frame - 1]
+        if size < self.rows * row_bytes:
+            raise ValueError("frame {0} of \"{1}\" is truncated".format(frame, self.info["Filename"]))
+        # rows may be padded, e.g. rgb rows to 4 bytes and v210 rows to 128 bytes
+        stride = size // self.rows if size % self.rows == 0 and self.layout != "yv12" and self.layout != "i420" else row_bytes
+        return self.data[offset:offset + self.rows * stride].reshape(self.rows, stride)
+
+    def planes(self, frame):
+        rows, cols = self.rows, self.cols
+        if self.layout == "uyvy":
+            packed = self.frame_bytes(frame, 2 * cols)[:, :2 * cols]
+            return packed[:, 1::2], packed[:, 0::4], packed[:, 2::4]
+        if self.layout == "yuy2":
+            packed = self.frame_bytes(frame, 2 * cols)[:, :2 * cols]
+            return packed[:, 0::2], packed[:, 1::4], packed[:, 3::4]
+        if self.layout in ("yv12", "i420"):
+            planar = self.frame_bytes(frame, 3 * cols // 2).reshape(-1)
+            chroma = (rows // 2) * (cols // 2)
+            y = planar[:rows * cols].reshape(rows, cols)
+            first = planar[rows * cols:rows * cols + chroma].reshape(rows // 2, cols // 2)
+            second = planar[rows * cols + chroma:rows * cols + 2 * chroma].reshape(rows // 2, cols // 2)
+            return (y, second, first) if self.layout == "yv12" else (y, first, second)     # yv12 stores Cr first
+        if self.layout in ("rgb24", "rgb32"):
+            depth = 3 if self.layout == "rgb24" else 4
+            bgr = self.frame_bytes(frame, depth * cols)[::-1, :depth * cols].reshape(rows, cols, depth)  # bottom row first
+            return bgr[:, :, 2], bgr[:, :, 1], bgr[:, :, 0]
+        # v210: three 10-bit values per little endian 32-bit word, Cb Y Cr Y Cb Y ...
+        words = (2 * cols + 2) // 3
+        packed = self.frame_bytes(frame, 4 * words)
+        packed = np.ascontiguousarray(packed[:, :4 * words]).view("<u4")
+        values = np.stack([ packed & 0x3FF, (packed >> 10) & 0x3FF, (packed >> 20) & 0x3FF ], axis=2).reshape(rows, -1)[:, :2 * cols]
+        return values[:, 1::2].astype(np.uint16), values[:, 0::4].astype(np.uint16), values[:, 2::4].astype(np.uint16)
+
+    def y_plane(self, frame):
+        if self.layout in ("uyvy", "yuy2", "yv12", "i420"):
+            return self.planes(frame)[0]
+        if self.layout == "v210":
+            return self.planes(frame)[0].astype(np.float32) / 4
+        r, g, b = self.planes(frame)
+        return (16.0 + RgbToYcbcr[0, 0] * r + RgbToYcbcr[0, 1] * g + RgbToYcbcr[0, 2] * b).astype(np.float32)
+
+    def frame_range(self, start, stop, sroi):
+        stop = start if stop is None else stop
+        if start < 1 or stop < start or stop > self.info["NumFrames"]:
+            raise IndexError("frames {0} to {1} of \"{2}\" are not valid".format(start, stop, self.info["Filename"]))
+        if sroi is None:
+            sroi = (1, 1, self.rows, self.cols)
+        top, left, bottom, right = sroi
+        if top < 1 or left < 1 or bottom > self.rows or right > self.cols or bottom < top or right < left:
+            raise ValueError("sroi {0} is outside of the {1}x{2} image".format(sroi, self.rows, self.cols))
+        return range(start, stop + 1), slice(top - 1, bottom), slice(left - 1, right)
+
+    def read_y(self, start = 1, stop = None, sroi = None):
+        frames, rows, cols = self.frame_range(start, stop, sroi)
+        y = np.empty((rows.stop - rows.start, cols.stop - cols.start, len(frames)), dtype=np.float32)
+        for index, frame in enumerate(frames):
+            y[:, :, index] = self.y_plane(frame)[rows, cols]
+        return y
+
+    def read(self, color_out, start = 1, stop = None, sroi = None, sub128 = False, interp = False):
+        if color_out not in ("YCbCr", "RGB"):
+            raise ValueError("Return type flag not recognized")
+        if sub128 and color_out == "RGB":
+            raise ValueError("RGB and '128' flag are incompatible")
+        if interp and self.layout in ("yv12", "i420"):
+            raise ValueError("Cannot interpolate yv12 format")
+        frames, rows, cols = self.frame_range(start, stop, sroi)
+        out = [ np.empty((rows.stop - rows.start, cols.stop - cols.start, len(frames)), dtype=np.float32) for plane in range(3) ]
+        for index, frame in enumerate(frames):
+            c1, c2, c3 = self.read_frame(frame, rows, cols, interp)
+            if self.layout in ("rgb24", "rgb32") and color_out == "YCbCr":
+                c1, c2, c3 = [ offset + RgbToYcbcr[plane, 0] * c1 + RgbToYcbcr[plane, 1] * c2 + RgbToYcbcr[plane, 2] * c3
+                               for plane, offset in enumerate([ 16.0, 128.0, 128.0 ]) ]
+            elif self.layout not in ("rgb24", "rgb32") and color_out == "RGB":
+                ycbcr = (c1 - 16.0, c2 - 128.0, c3 - 128.0)
+                c1, c2, c3 = [ np.clip(YcbcrToRgb[plane, 0] * ycbcr[0] + YcbcrToRgb[plane, 1] * ycbcr[1] + YcbcrToRgb[plane, 2] * ycbcr[2], 0, 255)
+                               for plane in range(3) ]
+            if sub128:
+                c2, c3 = c2 - 128, c3 - 128
+            out[0][:, :, index], out[1][:, :, index], out[2][:, :, index] = c1, c2, c3
+        return out[0], out[1], out[2]
+
+    # one frame as float32 planes at full resolution, chroma replicated or interpolated as in read_avi.m
+    def read_frame(self, frame, rows, cols, interp):
+        c1, c2, c3 = self.planes(frame)
+        if self.layout in ("rgb24", "rgb32"):
+            return [ plane[rows, cols].astype(np.float32) for plane in (c1, c2, c3) ]
+        scale = 4.0 if self.layout == "v210" else 1.0
+        y = c1[rows, cols].astype(np.float32) / scale
+        chroma = []
+        for plane in (c2, c3):
+            if self.layout in ("yv12", "i420"):
+                plane = plane[rows.start // 2:(rows.stop + 1) // 2]
+                plane = np.repeat(np.repeat(plane, 2, axis=0), 2, axis=1)[rows.start % 2:rows.start % 2 + rows.stop - rows.start]
+            else:
+                plane = np.repeat(plane[rows], 2, axis=1)
+            plane = plane.astype(np.float32) / scale
+            if interp:
+                # odd columns (even in read_avi.m) are the mean of their neighbours, up to the last pair
+                plane[:, 1:self.cols - 2:2] = (plane[:, 0:self.cols - 3:2] + plane[:, 2:self.cols - 1:2]) / 2
+                if self.layout != "v210":
+                    plane[:, 1:self.cols - 2:2] = np.floor(plane[:, 1:self.cols - 2:2] + 0.5)
+            chroma.append(plane[:, cols])
+        return y, chroma[0], chroma[1]
+
+# read_avi
+#   read_avi.m style call
+# SYNTAX
+#   info       = read_avi("Info", avi_file)
+#   c1, c2, c3 = read_avi(color_out, avi_file, frames = (start, stop), sroi = None, sub128 = False, interp = False)
+#
+def read_avi(color_out, avi_file, frames = (1, 1), sroi = None, sub128 = False, interp = False):
+    if color_out.lower() == "info":
+        return avi_info(avi_file)
+    with AviFile(avi_file) as avi:
+        return avi.read(color_out, frames[0], frames[1], sroi=sroi, sub128=sub128, interp=interp)
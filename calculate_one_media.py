@@ -0,0 +1,288 @@
+############################################################################################
+# Program Name : Calculate One Media
+# Description  : Python equivalent of calculate_one_media.m and read_media.m for
+#                   uncompressed AVI media (avi_reader.py). Runs a no-reference feature
+#                   function (NRFF) on one media of a dataset, with the read_mode
+#                   ('all', 'si', 'ti') and luma_only semantics of calculate_NRpars.m.
+#                   For 'si' and 'ti', frames are read ReadTime frames at a time, as the
+#                   parallel mode of calculate_one_media.m, so memory is bounded by the
+#                   window instead of the length of the clip. Windows are processed in
+#                   order in this process, or fanned out to TsliceWorkers processes.
+############################################################################################
+
+import os
+import numpy as np
+import scipy.io
+from concurrent.futures import ProcessPoolExecutor
+from avi_reader import AviFile, avi_info
+from mat_reader import MatFile, read_field
+
+ReadTime      = 10          # frames read at a time, read_time of calculate_one_media.m
+TsliceWorkers = 4           # worker processes when parallel_tslices is True
+MediaFields   = [ "name", "file", "start", "stop", "fps", "image_rows", "image_cols", "valid_top", "valid_left",
+                  "valid_bottom", "valid_right", "video_standard" ]
+TextFields    = [ "name", "file", "video_standard" ]
+
+# Feature functions
+#   A feature function is called as in calculate_NRpars.m, feature_function(mode, ...):
+#       feature_function('group')            name of the group, str
+#       feature_function('feature_names')    list of feature names
+#       feature_function('parameter_names')  list of parameter names
+#       feature_function('luma_only')        True to receive only Y
+#       feature_function('read_mode')        'all', 'si' or 'ti'
+#       feature_function('pixels', fps, y)   or ('pixels', fps, y, cb, cr), list of one
+#                                            array per feature; for 'all' the extra
+#                                            arguments path and file are also given
+#       feature_function('pars', feature_data, fps, [image_rows, image_cols])   list of parameters
+#   y, cb and cr are rows x columns x frames arrays. In parallel mode the feature function
+#   is sent to the worker processes, so it must be defined at module level.
+
+# load_dataset
+#   Read a dataset structure from a .mat file
+# SYNTAX
+#   dataset = load_dataset(mat_file, variable)
+# SEMANTICS
+#   Returns a dictionary with dataset_name, path and media, a list with one
+#   dictionary per media holding the MediaFields.
+#
+def load_dataset(mat_file, variable):
+    with MatFile(mat_file) as mat:
+        fields = {}
+        for field in MediaFields:
+            values = mat.read(variable + ".media." + field)
+            fields[field] = values if isinstance(values, list) else [ values ]
+        dataset = { "dataset_name": str(mat.read(variable + ".dataset_name")), "path": str(mat.read(variable + ".path")) }
+    dataset["media"] = []
+    for index in range(len(fields["name"])):
+        media = {}
+        for field in MediaFields:
+            value = fields[field][index]
+            media[field] = str(value) if field in TextFields else float(np.asarray(value).reshape(-1)[0])
+        media["start"] = int(media["start"])
+        media["stop"] = int(media["stop"])
+        dataset["media"].append(media)
+    return dataset
+
+# media_file
+#   Path of the file of a media
+#
+def media_file(dataset, media):
+    return os.path.join(dataset["path"].replace("\\", os.sep), media["file"].replace("\\", os.sep))
+
+# open_media
+#   Open the AVI file of a media, checking it can be read without read_media.m
+#
+def open_media(dataset, media, info = None):
+    if not media["file"].lower().endswith(".avi"):
+        raise NotImplementedError("\"{0}\" is not an avi file, read it with read_media.m".format(media["file"]))
+    avi = AviFile(media_file(dataset, media), info)
+    image_rows, image_cols = media["image_rows"], media["image_cols"]
+    if not (np.isnan(image_rows) or np.isnan(image_cols)) and (image_rows != avi.rows or image_cols != avi.cols):
+        raise NotImplementedError("\"{0}\" is {1}x{2}, image_scale.m to {3}x{4} is not implemented"
+                                  .format(media["file"], avi.rows, avi.cols, int(image_rows), int(image_cols)))
+    return avi
+
+# split_into_fields
+#   De-interlace rows x columns x frames planes, as split_into_fields of read_media.m:
+#   each field becomes a frame with its lines doubled, the early field first
+#
+def split_into_fields(y, video_standard):
+    if y.shape[0] % 2 != 0:
+        raise ValueError("interlaced media must have an even number of rows, {0} read".format(y.shape[0]))
+    if video_standard == "interlace_lower_field_first":
+        early, late = y[1::2], y[0::2]
+    elif video_standard == "interlace_upper_field_first":
+        early, late = y[0::2], y[1::2]
+    else:
+        raise ValueError("Input type flag not recognized")
+    fields = np.empty((y.shape[0], y.shape[1], 2 * y.shape[2]), dtype=y.dtype)
+    fields[:, :, 0::2] = np.repeat(early, 2, axis=0)
+    fields[:, :, 1::2] = np.repeat(late, 2, axis=0)
+    return fields
+
+# read_frames
+#   read_media('frames', ...) of an open AVI file
+# SYNTAX
+#   planes = read_frames(avi, media, start, stop, luma_only)
+# SEMANTICS
+#   Returns (y,) if luma_only, else (y, cb, cr), frames start to stop (1 based,
+#   inclusive) of the valid region of the media, Cb and Cr minus 128.
+#   Interlaced media are split into fields, so twice as many frames are returned.
+#
+def read_frames(avi, media, start, stop, luma_only):
+    if start < media["start"] or stop > media["stop"]:
+        raise ValueError("read_media: requested frames are out-of-bounds, beyond available limits")
+    valid = (media["valid_top"], media["valid_left"], media["valid_bottom"], media["valid_right"])
+    has_valid = not any(np.isnan(value) for value in valid)
+    sroi = tuple(int(value) for value in valid) if has_valid else None
+    if luma_only:
+        planes = (avi.read_y(start, stop, sroi=sroi),)
+    else:
+        planes = avi.read("YCbCr", start, stop, sroi=sroi, sub128=True)
+    if has_valid:
+        planes = tuple(plane.astype(np.float64) for plane in planes)       # read_media.m returns double for a valid region
+    if media["video_standard"] in ("interlace_lower_field_first", "interlace_upper_field_first"):
+        planes = tuple(split_into_fields(plane, media["video_standard"]) for plane in planes)
+    return planes
+
+# tslice_plan
+#   Overlap and frame windows of a media for read_mode 'si' or 'ti'
+# SYNTAX
+#   overlap, windows = tslice_plan(media, read_mode, read_time = ReadTime)
+# SEMANTICS
+#   overlap is 0 for 'si', else the distance between the frames of a 'ti' pair:
+#   1 frame for progressive media, 2 fields for interlaced media. windows is a list
+#   of (start, stop) frames: read_time frames, plus one frame shared with the next
+#   window for 'ti', as the parallel mode of calculate_one_media.m.
+#
+def tslice_plan(media, read_mode, read_time = ReadTime):
+    is_overlap = 0 if read_mode == "si" else 1
+    overlap = 0 if read_mode == "si" else (1 if media["video_standard"] == "progressive" else 2)
+    starts = list(range(media["start"], media["stop"] - is_overlap + 1, read_time))
+    windows = [ (start, min(start + read_time - 1 + is_overlap, media["stop"])) for start in starts ]
+    if len(windows) > 0:
+        windows[-1] = (windows[-1][0], media["stop"])
+    return overlap, windows
+
+# window_tslices
+#   Time slices of the frames of one window: each frame for 'si', frame pairs
+#   [cnt, cnt + overlap] for 'ti'
+#
+def window_tslices(planes, read_mode, overlap):
+    frames = planes[0].shape[2]
+    for cnt in range(frames - overlap):
+        index = [ cnt ] if read_mode == "si" else [ cnt, cnt + overlap ]
+        yield tuple(plane[:, :, index] for plane in planes)
+
+# read_tslices
+#   Generator of the time slices of one media
+# SYNTAX
+#   for tslice in read_tslices(dataset, media_num, read_mode, luma_only):
+# SEMANTICS
+#   Yields the (y,) or (y, cb, cr) arrays passed to a feature function in 'pixels'
+#   mode, for read_mode 'si' or 'ti'. Only one window of frames is in memory.
+#   media_num is 1 based, as in calculate_one_media.m.
+#
+def read_tslices(dataset, media_num, read_mode, luma_only, read_time = ReadTime):
+    media = dataset["media"][media_num - 1]
+    overlap, windows = tslice_plan(media, read_mode, read_time)
+    with open_media(dataset, media) as avi:
+        if len(windows) == 0 and read_mode == "ti" and media["start"] == media["stop"]:
+            # an image: 'ti' compares the frame with itself
+            if media["video_standard"] != "progressive":
+                raise ValueError("Media {0} is marked as an interlaced image; this is impossible".format(media["name"]))
+            planes = read_frames(avi, media, media["start"], media["stop"], luma_only)
+            yield tuple(np.concatenate([ plane, plane ], axis=2) for plane in planes)
+            return
+        for start, stop in windows:
+            for tslice in window_tslices(read_frames(avi, media, start, stop, luma_only), read_mode, overlap):
+                yield tslice
+
+# check_tslice
+#   Error checks of the 'pixels' output of a feature function for one time slice
+#
+def check_tslice(this_frame, feature_function, media, tslice):
+    if not isinstance(this_frame, (list, tuple)):
+        raise ValueError("feature_function for group '{0}': mode 'pixels' must return a list, with one array for each feature name"
+                         .format(feature_function("group")))
+    if len(this_frame) != len(feature_function("feature_names")):
+        raise ValueError("feature_function for group '{0}': 'pixels' mode returns {1} features, but 'feature_names' mode specifies {2} features (media {3})"
+                         .format(feature_function("group"), len(this_frame), len(feature_function("feature_names")), media["name"]))
+    for feature, value in enumerate(this_frame):
+        if np.ndim(value) > 2:
+            raise ValueError("feature_function for group '{0}': feature {1} contains three (3) or more dimensions; it must have no more than two dimensions (media {2}, time slice {3})"
+                             .format(feature_function("group"), feature + 1, media["name"], tslice + 1))
+
+# calculate_window
+#   Features of the time slices of one window, run in a worker process
+#
+def calculate_window(dataset, media, info, start, stop, read_mode, overlap, feature_function):
+    luma_only = feature_function("luma_only")
+    with open_media(dataset, media, info) as avi:
+        planes = read_frames(avi, media, start, stop, luma_only)
+    return [ feature_function("pixels", media["fps"], *tslice) for tslice in window_tslices(planes, read_mode, overlap) ]
+
+# stack_features
+#   feature_data of the 'pars' mode: one array per feature, time slices by rows by columns
+#
+def stack_features(tslices, feature_function, media):
+    feature_data = [ [] for name in feature_function("feature_names") ]
+    for tslice, this_frame in enumerate(tslices):
+        check_tslice(this_frame, feature_function, media, tslice)
+        for feature, value in enumerate(this_frame):
+            value = np.atleast_2d(np.asarray(value, dtype=np.float64))
+            if len(feature_data[feature]) > 0 and value.shape != feature_data[feature][0].shape:
+                raise ValueError("feature_function for group '{0}': feature {1} changes in size from one frame to the next. Check frame {2} (media {3})"
+                                 .format(feature_function("group"), feature + 1, tslice + 1, media["name"]))
+            feature_data[feature].append(value)
+    return [ np.stack(values) if len(values) > 0 else np.empty((0, 0, 0)) for values in feature_data ]
+
+# feature_file
+#   File of one feature of one media, <data_dir>/group_<group>/features/<feature>/<media name>.mat
+#
+def feature_file(data_dir, group, feature, media):
+    return os.path.join(data_dir, "group_" + group, "features", feature, media["name"].replace("\\", os.sep) + ".mat")
+
+# calculate_one_media
+#   Run an NRFF on one media
+# SYNTAX
+#   par_data = calculate_one_media(dataset, media_num, data_dir, parallel_tslices, feature_function)
+# SEMANTICS
+#   As calculate_one_media.m: features already saved in data_dir are loaded,
+#   otherwise the features are calculated and saved, then the parameters are
+#   calculated with the 'pars' mode and returned. For read_mode 'all' the whole
+#   media is read and passed to one 'pixels' call. For 'si' and 'ti', the time
+#   slices are streamed window by window (read_tslices), or the windows are
+#   computed in TsliceWorkers processes if parallel_tslices is True. Images
+#   in 'ti' mode are always read by read_tslices.
+#
+def calculate_one_media(dataset, media_num, data_dir, parallel_tslices, feature_function):
+    media = dataset["media"][media_num - 1]
+    group = feature_function("group")
+    read_mode = feature_function("read_mode")
+    if read_mode not in ("all", "si", "ti"):
+        raise ValueError("feature_function for group '{0}' called with 'read_mode': returned value not recognized; 'all', 'si', or 'ti' expected (dataset {1}, media {2})"
+                         .format(group, dataset["dataset_name"], media["name"]))
+    feature_names = feature_function("feature_names")
+    luma_only = feature_function("luma_only")
+    image_size = [ media["image_rows"], media["image_cols"] ]
+
+    # features may already be computed
+    files = [ feature_file(data_dir, group, feature, media) for feature in feature_names ]
+    if all(os.path.isfile(file) for file in files):
+        feature_data = [ read_field(file, "data", squeeze = False) for file in files ]          # not squeezed, as load(), for v5 and v7.3 files
+        return feature_function("pars", feature_data, media["fps"], image_size)
+
+    if read_mode == "all":
+        with open_media(dataset, media) as avi:
+            planes = read_frames(avi, media, media["start"], media["stop"], luma_only)
+        if luma_only:
+            feature_data = feature_function("pixels", media["fps"], *planes)
+        else:
+            feature_data = feature_function("pixels", media["fps"], *planes, dataset["path"], media["file"])
+        planes = None
+    else:
+        overlap, windows = tslice_plan(media, read_mode)
+        if not parallel_tslices or len(windows) == 0:
+            # an image has no 'ti' window, read_tslices pairs the frame with itself
+            tslices = (feature_function("pixels", media["fps"], *tslice) for tslice in read_tslices(dataset, media_num, read_mode, luma_only))
+            feature_data = stack_features(tslices, feature_function, media)
+        else:
+            info = avi_info(media_file(dataset, media))                 # parsed once, sent to the workers
+            count = len(windows)
+            with ProcessPoolExecutor(max_workers=TsliceWorkers) as pool:
+                results = pool.map(calculate_window, [ dataset ] * count, [ media ] * count, [ info ] * count,
+                                   [ start for start, stop in windows ], [ stop for start, stop in windows ],
+                                   [ read_mode ] * count, [ overlap ] * count, [ feature_function ] * count)
+                feature_data = stack_features((this_frame for window in results for this_frame in window), feature_function, media)
+
+    par_data = feature_function("pars", feature_data, media["fps"], image_size)
+    if len(feature_function("parameter_names")) != len(par_data):
+        raise ValueError("feature_function for group '{0}': {1} parameter names specified, {2} parameters returned by 'pars' mode (media {3})"
+                         .format(group, len(feature_function("parameter_names")), len(par_data), media["name"]))
+
+    # save NR features
+    for file, data in zip(files, feature_data):
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        scipy.io.savemat(file, { "data": data })
+    return par_data
@@ -12,6 +12,7 @@ import matplotlib.pyplot as plt
 import pandas as pd
 import scipy
 import scipy.io
+from mat_reader import MatFile
 
 # Input Value Files and Fields
 MOSFileNameList     = []
@@ -195,94 +196,54 @@ def read_mos_and_nrpars():
             print("  <Failed to find MOS File \"{0}\">".format(MOSFileNameList[index]))
             exit(0)
 
-        data = scipy.io.loadmat(MOSFileNameList[index])
-
-        if not MOSFieldNameList[index] in data.keys():
-            print("  <Failed to find MOS Dataset Field \"{0}\">".format(MOSFieldNameList[index]))
-            exit(0)
-
-        data = data[MOSFieldNameList[index]]
-
-        if not( type(data      )==np.ndarray and len(data   )>0 \
-            and type(data[0]   )==np.ndarray and len(data[0])>0 \
-            and type(data[0][0])==np.void    and "media" in np.dtype(data[0][0]).names):
-            print("  <Failed to find \"media\" Field in MOS Dataset \"{0}\">".format(MOSFieldNameList[index]))
-            exit(0)
-
-        dataIndex = np.dtype(data[0][0]).names.index("media")
-        data = data[0][0]
-
-        if not(dataIndex<len(data) \
-            and type(data[dataIndex]   )==np.ndarray and len(data[dataIndex]   )>0 \
-            and type(data[dataIndex][0])==np.ndarray and len(data[dataIndex][0])>0):
-            print("  <Failed to find \"media\" Field as a List in MOS Dataset \"{0}\">".format(MOSFieldNameList[index]))
-            exit(0)
+        # Only the mos field of each media is read (lazily for v7.3 files)
+        with MatFile(MOSFileNameList[index]) as mat:
+            try:
+                mosList = mat.read(MOSFieldNameList[index]+".media.mos")
+            except (KeyError, AttributeError):
+                print("  <Failed to find MOS Dataset Field \"{0}\" with \"media\" and \"mos\" Fields>".format(MOSFieldNameList[index]))
+                exit(0)
 
+        mosList = mosList if type(mosList)==list else list(np.atleast_1d(mosList))
         MOSDict[dataSetName] = []
-        for rowIndex in range(len(data[dataIndex][0])):
-            row = data[dataIndex][0][rowIndex]
-            if not("mos" in np.dtype(row).names):
-                print("  <Failed to find MOS column on row \"{0}\">".format(rowIndex))
-                exit(0)
-            columnIndex = np.dtype(row).names.index("mos")
-            if not( type(row[columnIndex]      )==np.ndarray and len(row[columnIndex]   )>0 \
-                and type(row[columnIndex][0]   )==np.ndarray and len(row[columnIndex][0])>0 \
-                and type(row[columnIndex][0][0]) in (np.int8, np.int16, np.int32, np.int64, np.uint8, np.uint16, np.uint32, np.uint64, np.float32, np.float64)):
+        for rowIndex in range(len(mosList)):
+            mos = np.asarray(mosList[rowIndex])
+            if not(mos.size==1 and mos.dtype.kind in "iuf"):
                 print("  <Failed to find MOS column as a formatted float on row \"{0}\">".format(rowIndex))
                 exit(0)
-            mos = float(row[columnIndex][0][0])
-            MOSDict[dataSetName].append(mos)
+            MOSDict[dataSetName].append(float(mos))
 
         # Attempt to read NRPars file
         if not os.path.exists(NRParsFileNameList[index]):
             print("  <Failed to find NRPars File \"{0}\">".format(NRParsFileNameList[index]))
             exit(0)
 
-        data = scipy.io.loadmat(NRParsFileNameList[index])
-
-        if not "NRpars" in data.keys():
-            print("  <Failed to find NRPars Dataset Field \"NRPars\">")
-            exit(0)
-
-        data = data["NRpars"]
-
-        if not( type(data      )==np.ndarray and len(data      )>0 \
-            and type(data[0]   )==np.ndarray and len(data[0]   )>0 \
-            and type(data[0][0])==np.void    and "par_name" in np.dtype(data[0][0]).names and "data" in np.dtype(data[0][0]).names):
-            print("  <Failed to find \"par_name\" and \"data\" Fields in NRPars Dataset \"{0}\">".format(NRParsFieldNameList[index]))
-            exit(0)
-
-        data = data[0][0]
-        dataIndex1 = np.dtype(data).names.index("par_name")
-        dataIndex2 = np.dtype(data).names.index("data")
+        # Only the parameter names and the row of the wanted parameter are read (lazily for v7.3 files)
+        with MatFile(NRParsFileNameList[index]) as mat:
+            try:
+                parNames = mat.read("NRpars.par_name")
+            except (KeyError, AttributeError):
+                print("  <Failed to find \"par_name\" and \"data\" Fields in NRPars Dataset \"{0}\">".format(NRParsFieldNameList[index]))
+                exit(0)
 
-        if not(dataIndex1<len(data) and dataIndex2<len(data) \
-            and type(data[dataIndex1]   )==np.ndarray and len(data[dataIndex1]   )>0 \
-            and type(data[dataIndex1][0])==np.ndarray and len(data[dataIndex1][0])>0 \
-            and type(data[dataIndex2]   )==np.ndarray and len(data[dataIndex2]   )>0):
-            print("  <Failed to find \"par_name\" and \"data\" Fields as a List in MOS Dataset \"{0}\">".format(MOSFieldNameList[index]))
-            exit(0)
+            parNames = [ str(name) for name in (parNames if type(parNames)==list else np.atleast_1d(parNames)) ]
 
-        parNames = [ str(d[0]) for d in data[dataIndex1][0] if type(d)==np.ndarray and len(d)>0 and type(d[0])==np.str_ ]
+            if not(NRParsFieldNameList[index] in parNames):
+                print("  <Failed to find parameter name \"{0}\">".format(NRParsFieldNameList[index]))
+                exit(0)
 
-        if not(NRParsFieldNameList[index] in parNames):
-            print("  <Failed to find parameter name \"{0}\">".format(NRParsFieldNameList[index]))
-            exit(0)
+            parNamesIndex = parNames.index(NRParsFieldNameList[index])
 
-        parNamesIndex = parNames.index(NRParsFieldNameList[index])
+            try:
+                values = np.atleast_1d(mat.read_row("NRpars.data", parNamesIndex)) if len(parNames)>1 else np.atleast_1d(mat.read("NRpars.data"))
+            except (KeyError, AttributeError, IndexError):
+                print("  <Failed to find data Fields for parameter name \"{0}\">".format(NRParsFieldNameList[index]))
+                exit(0)
 
-        if not(parNamesIndex<len(data[dataIndex2]) \
-            and type(data[dataIndex2][parNamesIndex])==np.ndarray and len(data[dataIndex2][parNamesIndex])>0):
-            print("  <Failed to find data Fields for parameter name \"{0}\">".format(NRParsFieldNameList[index]))
+        if not values.dtype.kind in "iuf":
+            print("  <Failed to find data as a formatted float for parameter name \"{0}\">".format(NRParsFieldNameList[index]))
             exit(0)
-
-        NRParsDict[dataSetName] = []
-        for rowIndex in range(len(data[dataIndex2][parNamesIndex])):
-            val = data[dataIndex2][parNamesIndex][rowIndex]
-            if not type(val) in (np.int8, np.int16, np.int32, np.int64, np.uint8, np.uint16, np.uint32, np.uint64, np.float32, np.float64):
-                print("  <Failed to find data as a formatted float on row \"{0}\">".format(rowIndex))
-                exit(0)
-            NRParsDict[dataSetName].append(val)
+        NRParsDict[dataSetName] = list(values)
 
         if not len(MOSDict[dataSetName])==len(NRParsDict[dataSetName]):
             print("  <Failed To Read Data Where {0} MOS Rows and {1} NRPars Rows>".format(len(MOSDict[dataSetName]), len(NRParsDict[dataSetName])))
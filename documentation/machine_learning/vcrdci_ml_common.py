@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""Shared pieces of the vcrdci123 ML examples
+
+The data loading, metrics and network of vcrdci_ml_nosfs_eg.py and vcrdci_ml_sfs_eg.py,
+as functions, for scripts that train many networks (vcrdci_ml_sfs_parallel.py).
+"""
+
+import tensorflow as tf
+import numpy as np
+from sklearn.model_selection import train_test_split
+
+from tensorflow.keras import backend as K
+
+from vcrdci_ml_feature_store import data_file, load_feature_store
+
+
+max_rows = None         # rows kept after filtering, None keeps all, 500 as in the examples
+
+
+def pearson_r(y_true, y_pred):
+    x = y_true
+    y = y_pred
+    mx = K.mean(x, axis=0)
+    my = K.mean(y, axis=0)
+    xm, ym = x - mx, y - my
+    r_num = K.sum(xm * ym)
+    x_square_sum = K.sum(xm * xm)
+    y_square_sum = K.sum(ym * ym)
+    r_den = K.sqrt(x_square_sum * y_square_sum)
+    r = r_num / r_den
+    return K.mean(r)
+
+
+class DatasetPearson(tf.keras.metrics.Metric):
+    """Pearson correlation of all batches seen since the last reset, not the mean of per batch values.
+
+    Keeps the count, sums, sums of squares and cross product of labels and predictions, so the value
+    logged for an epoch (or returned by evaluate) is exact for the whole dataset without another predict pass.
+    """
+
+    def __init__(self, name="pearson_r", **kwargs):
+        super().__init__(name=name, **kwargs)
+        self.stats = self.add_weight(name="stats", shape=(6,), initializer="zeros", dtype=tf.float64)
+
+    def update_state(self, y_true, y_pred, sample_weight=None):
+        x = tf.cast(tf.reshape(y_true, [-1]), tf.float64)
+        y = tf.cast(tf.reshape(y_pred, [-1]), tf.float64)
+        self.stats.assign_add(tf.stack([
+            tf.cast(tf.size(x), tf.float64),
+            tf.reduce_sum(x),
+            tf.reduce_sum(y),
+            tf.reduce_sum(x * x),
+            tf.reduce_sum(y * y),
+            tf.reduce_sum(x * y),
+        ]))
+
+    def result(self):
+        n, x_sum, y_sum, x_square_sum, y_square_sum, xy_sum = tf.unstack(self.stats)
+        covariance = xy_sum - x_sum * y_sum / n
+        x_variance = x_square_sum - x_sum * x_sum / n
+        y_variance = y_square_sum - y_sum * y_sum / n
+        return tf.cast(tf.math.divide_no_nan(covariance, tf.sqrt(x_variance * y_variance)), tf.float32)
+
+    def reset_state(self):
+        self.stats.assign(tf.zeros((6,), dtype=tf.float64))
+
+
+def load_vcrdci(file_name=data_file):
+    """Load the feature store (vcrdci_ml_feature_store.py), returns the one-hot encoded features, the raw_mos labels
+    and the store metadata.  Features and labels are memory mapped, limited to the first max_rows rows."""
+    features, labels, meta = load_feature_store(file_name)
+    return features[:max_rows], labels[:max_rows], meta
+
+
+def split(features, labels):
+    """Same 80/20 split as the examples, returns feature_train, feature_test, label_train, label_test as arrays."""
+    feature_train, feature_test, label_train, label_test = train_test_split(features, labels, test_size = 0.2, random_state = 1)
+    return np.array(feature_train), np.array(feature_test), np.array(label_train), np.array(label_test)
+
+
+def normalize(features, reference):
+    """Scale features with the mean and variance of reference, as tf.keras.layers.Normalization after adapt(reference)."""
+    reference = np.asarray(reference, dtype=np.float64)
+    mean = reference.mean(axis=0)
+    std = np.maximum(np.sqrt(reference.var(axis=0)), K.epsilon())
+    return ((np.asarray(features, dtype=np.float64) - mean) / std).astype(np.float32)
+
+
+def build_mlp(n_inputs, normalization=None):
+    """The 500x500 network of the examples, with an optional Normalization layer in front."""
+    layers = [] if normalization is None else [normalization]
+    model = tf.keras.Sequential(
+        layers + [
+            tf.keras.layers.Dense(
+                500,
+                activation="relu",
+                input_shape=(n_inputs,),
+                kernel_regularizer=tf.keras.regularizers.l2(0.001),
+            ),
+            tf.keras.layers.Dropout(0.2),
+            tf.keras.layers.Dense(
+                500,
+                activation="relu",
+                kernel_regularizer=tf.keras.regularizers.l2(0.001),
+            ),
+            tf.keras.layers.Dropout(0.2),
+            tf.keras.layers.Dense(1),
+        ]
+    )
+
+    model.compile(
+        optimizer="adam",
+        loss=tf.keras.losses.MeanSquaredError(),
+        metrics=["mse", DatasetPearson(), tf.keras.metrics.RootMeanSquaredError(name="rmse")],   # exact over each dataset
+    )
+    return model
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""vcrdci123 scene-grouped k-fold cross-validation
+
+The examples test on one random 20% of the rows, so media of the same scene are in both the
+training and the test set.  Here every media is assigned the scene number of its dataset
+spreadsheet (group_column of the 'Category' sheet, Category7 for VCRDCI) and the scenes are
+split into n_folds folds (GroupKFold): no scene is ever in the training and test set of the same
+fold.  The folds are trained at the same time in worker processes, each limited to tf_threads
+TensorFlow threads, streaming the feature store (vcrdci_ml_feature_store.py, vcrdci_ml_input.py).
+Test RMSE and Pearson correlation are exact over each fold (DatasetPearson in vcrdci_ml_common.py)
+and are reported per fold and as mean and standard deviation over the folds.
+"""
+
+import sys
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import numpy as np
+from sklearn.model_selection import GroupKFold
+
+from vcrdci_ml_common import load_vcrdci, build_mlp
+from vcrdci_ml_feature_store import load_media
+from vcrdci_ml_input import validation_rows, make_dataset
+
+
+group_workbooks = ["VCRDCI_1.xlsx", "VCRDCI_2.xlsx", "VCRDCI_3.xlsx"]   # dataset spreadsheets written by export_dataset.m
+group_column = "Category7"                  # scene number
+n_folds = 5
+cv_workers = 5                              # folds trained at the same time
+tf_threads = 2                              # TensorFlow threads per worker
+feature_columns = None                      # store columns to train on, e.g. an SFS subset, None for all
+results_file = "vcrdci123_cv_results.csv"
+epochs = 1000
+
+worker_data = {}
+
+
+def read_groups(workbooks):
+    """Dictionary of media name to group, from the 'Category' sheet of the dataset spreadsheets."""
+    groups = {}
+    for workbook in workbooks:
+        category_sheet = pd.read_excel(workbook, sheet_name="Category", usecols=["name", group_column])
+        category_sheet = category_sheet.dropna()
+        groups.update(zip(category_sheet["name"].astype(str), category_sheet[group_column].astype(str)))
+    return groups
+
+
+def media_groups(media, groups):
+    """Group of every media; media missing from the spreadsheets form a group of their own."""
+    missing = [name for name in media if name not in groups]
+    if len(missing) > 0:
+        print("{} media without {}, each is its own group".format(len(missing), group_column))
+    return np.array([groups.get(name, "media:" + name) for name in media])
+
+
+def init_worker(threads):
+    import tensorflow as tf
+
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+    features, labels, meta = load_vcrdci()                          # memory mapped, not copied into the worker
+    worker_data.update(features=features, labels=labels, meta=meta)
+
+
+def train_fold(fold, train_rows, test_rows, columns):
+    import tensorflow as tf
+
+    features, labels, meta = worker_data["features"], worker_data["labels"], worker_data["meta"]
+    columns = list(range(features.shape[1])) if columns is None else list(columns)
+    fit_rows, val_rows = validation_rows(np.random.default_rng(fold).permutation(train_rows))
+
+    tf.keras.backend.clear_session()
+    model = build_mlp(len(columns))
+    early_stop = tf.keras.callbacks.EarlyStopping(monitor="val_loss", patience=100, restore_best_weights=True)
+    history = model.fit(
+        make_dataset(features, labels, fit_rows, meta, columns=columns, seed=fold),
+        validation_data=make_dataset(features, labels, val_rows, meta, columns=columns, shuffle=False),
+        epochs=epochs,
+        callbacks=[early_stop],
+        verbose=0,
+    )
+    scores = model.evaluate(make_dataset(features, labels, test_rows, meta, columns=columns, shuffle=False),
+                            verbose=0, return_dict=True)
+    return {"fold": fold, "train_rows": len(train_rows), "test_rows": len(test_rows), "epochs": len(history.epoch),
+            "rmse": scores["rmse"], "pearson_r": scores["pearson_r"]}
+
+
+def cross_validate(columns=feature_columns):
+    features, labels, meta = load_vcrdci()
+    groups = media_groups(load_media()[:len(labels)], read_groups(group_workbooks))
+    folds = list(GroupKFold(n_splits=n_folds).split(np.zeros(len(labels)), groups=groups))
+    print("{} rows, {} groups, {} folds".format(len(labels), len(np.unique(groups)), n_folds))
+
+    context = multiprocessing.get_context("spawn")                 # TensorFlow is not fork safe
+    with ProcessPoolExecutor(max_workers=cv_workers, mp_context=context,
+                             initializer=init_worker, initargs=(tf_threads,)) as pool:
+        futures = [pool.submit(train_fold, fold, train_rows, test_rows, columns)
+                   for fold, (train_rows, test_rows) in enumerate(folds)]
+        results = pd.DataFrame([future.result() for future in futures])
+    return results
+
+
+def main():
+    columns = [int(index) for index in sys.argv[1:]] if len(sys.argv) > 1 else feature_columns
+    results = cross_validate(columns)
+    results.to_csv(results_file, index=False)
+    print(results.to_string(index=False))
+    for metric in ["rmse", "pearson_r"]:
+        print("{}: {:.3f} +/- {:.3f}".format(metric, results[metric].mean(), results[metric].std()))
+    print("results written to", results_file)
+
+
+if __name__ == "__main__":
+    main()
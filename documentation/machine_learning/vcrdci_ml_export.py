@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""vcrdci123 model export for NumPy inference
+
+Saves the Normalization statistics and Dense weights of a model made by build_model()
+(vcrdci_ml_nosfs_eg.py, vcrdci_ml_sfs_eg.py) or build_mlp() (vcrdci_ml_common.py) to a .npz file:
+    mean, std           Normalization layer, std = max(sqrt(variance), epsilon); absent without the layer
+    kernel_<n>, bias_<n>   weights of the n-th Dense layer, float32
+    activations         activation of each Dense layer
+    columns             feature store columns of the model inputs, in input order; absent when the
+                        model takes all store columns
+Dropout layers do nothing at inference and are left out.  vcrdci_ml_numpy_model.py scores
+features with the saved file without importing TensorFlow.
+"""
+
+import numpy as np
+import tensorflow as tf
+
+
+def export_model(model, file_name, columns=None):
+    """columns are the store column numbers of the inputs of a model trained on a subset (e.g. sffs.k_feature_idx_)."""
+    arrays = {}
+    if columns is not None:
+        arrays["columns"] = np.asarray(columns, dtype=np.int64)
+    activations = []
+    for layer in model.layers:
+        if isinstance(layer, tf.keras.layers.Normalization):
+            arrays["mean"] = np.asarray(layer.mean, dtype=np.float32).reshape(-1)
+            arrays["std"] = np.maximum(np.sqrt(np.asarray(layer.variance, dtype=np.float32).reshape(-1)),
+                                       tf.keras.backend.epsilon()).astype(np.float32)
+        elif isinstance(layer, tf.keras.layers.Dense):
+            arrays["kernel_" + str(len(activations))] = layer.kernel.numpy().astype(np.float32)
+            arrays["bias_" + str(len(activations))] = layer.bias.numpy().astype(np.float32)
+            activations.append(tf.keras.activations.serialize(layer.activation))
+        elif isinstance(layer, tf.keras.layers.Dropout) == False:
+            raise ValueError("layer {} cannot be exported".format(layer.name))
+
+    np.savez(file_name, activations=np.array(activations), **arrays)
+    print("{} Dense layers exported to {}".format(len(activations), file_name))
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""vcrdci123 binary feature matrix
+
+Parses vcrdci_123_all_data_eg_no_nans.csv once, in chunks, and saves the result next to it:
+    <csv>.features.npy   float32 matrix, one row per media, columns as after the examples' ColumnTransformer
+                         (one-hot columns of the categorical features first, then the other features)
+    <csv>.labels.npy     float32 raw_mos of each row
+    <csv>.media.npy      media name of each row
+    <csv>.meta.json      column names, one-hot categories (the fitted encoder state), mean and variance
+                         of every column (the Normalization state) and the csv version the store belongs to
+Only media with raw_mos >= min_raw_mos are stored, as in the examples.  load_feature_store() memory maps
+the matrix, and rebuilds the store first when the csv changed.  To build from the command line:
+    python vcrdci_ml_feature_store.py [csv file]
+"""
+
+import os
+import sys
+import json
+
+import pandas as pd
+import numpy as np
+
+
+data_file = "vcrdci_123_all_data_eg_no_nans.csv"
+column_names = [
+    "media",
+    "mos",
+    "raw_mos",
+    "EgCodecCategory",
+    "S-PanSpeed",
+    "S-Jiggle",
+    "S-FineDetail",
+    "S-WhiteLevel",
+    "S-BlackLevel",
+    "WhiteClipping",
+    "S-Blur",
+    "viqet-sharpness",
+    "NR-IQA-CDI mean",
+    "NR-IQA-CDI std",
+    "NR-IQA-CDI entropy",
+    "NR-IQA-CDI kurtosis",
+    "NR-IQA-CDI skewness",
+    "bps",
+    "eps",
+    "mean_error",
+    "Ifrac",
+    "Pfrac",
+    "Bfrac",
+    "mean_countP_countI_ratio",
+    "bps_pixels",
+    "max_relational_error",
+    "mean_relational_error",
+    "std_raw_vs_all_error",
+    "mean_raw_vs_all_error",
+    "max_relational_bits",
+    "mean_relational_bits",
+    "std_raw_vs_all_bits",
+    "mean_raw_vs_all_bits",
+    "max_relational_countP",
+    "mean_relational_countP",
+    "std_raw_vs_all_countP",
+    "mean_raw_vs_all_countP",
+    "mean_error_vs_mean_bits",
+    "mean_countP_vs_mean_bits",
+    "max_bps",
+    "max_to_mean_bits_per_frame",
+]
+dropped_columns = ["media", "mos"]
+label_column = "raw_mos"
+categorical_features = ["EgCodecCategory"]
+min_raw_mos = 60                # media with a lower raw_mos are left out, as in the examples
+chunk_rows = 100000             # csv rows parsed at a time
+store_version = 3               # changes when the files or statistics of the store change, older stores are rebuilt
+
+
+def store_files(file_name):
+    return file_name + ".features.npy", file_name + ".labels.npy", file_name + ".meta.json"
+
+
+def media_file(file_name):
+    return file_name + ".media.npy"
+
+
+def store_key(file_name):
+    stat = os.stat(file_name)
+    return [stat.st_mtime_ns, stat.st_size, min_raw_mos, store_version]
+
+
+def csv_chunks(file_name):
+    for chunk in pd.read_csv(file_name, skiprows=1, names=column_names, chunksize=chunk_rows):
+        yield chunk[chunk[label_column] >= min_raw_mos]
+
+
+def plain(value):
+    return value.item() if hasattr(value, "item") else value   # numpy scalar to a json value
+
+
+def encode_rows(frame, meta):
+    """One-hot encode and order the columns of frame as in the store, returns a float32 matrix."""
+    encoded = [(frame[feature].to_numpy()[:, None] == np.array(meta["categories"][feature], dtype=object)[None, :])
+               for feature in meta["categorical_features"]]
+    encoded.append(frame[meta["passthrough"]].to_numpy(dtype=np.float64))
+    return np.hstack(encoded).astype(np.float32)
+
+
+def merge_moments(mean, square_deviation, count, chunk):
+    """Mean and sum of squared deviations of count rows merged with the rows of chunk.
+
+    The chunk is centered on its own mean first, so the variance does not suffer the cancellation of
+    E[x^2] - mean^2 for columns with a large mean and a small spread.
+    """
+    chunk_count = len(chunk)
+    if chunk_count == 0:
+        return mean, square_deviation
+    chunk_mean = chunk.mean(axis=0)
+    chunk_square_deviation = np.square(chunk - chunk_mean).sum(axis=0)
+    total = count + chunk_count
+    delta = chunk_mean - mean
+    mean = mean + delta * (chunk_count / total)
+    square_deviation = square_deviation + chunk_square_deviation + delta ** 2 * (count * chunk_count / total)
+    return mean, square_deviation
+
+
+def build_feature_store(file_name=data_file):
+    features_file, labels_file, meta_file = store_files(file_name)
+
+    # first pass, row count, media names and categories of the one-hot encoder
+    n_rows = 0
+    media = []
+    categories = {feature: set() for feature in categorical_features}
+    for chunk in csv_chunks(file_name):
+        n_rows += len(chunk)
+        media.append(chunk["media"].astype(str).to_numpy())
+        for feature in categorical_features:
+            categories[feature].update(plain(value) for value in chunk[feature].unique())
+
+    passthrough = [name for name in column_names if name not in dropped_columns + [label_column] + categorical_features]
+    meta = {
+        "key": store_key(file_name),
+        "rows": n_rows,
+        "categorical_features": categorical_features,
+        "categories": {feature: sorted(values) for feature, values in categories.items()},   # sorted as OneHotEncoder
+        "passthrough": passthrough,
+    }
+    meta["columns"] = [feature + "_" + str(value) for feature in categorical_features for value in meta["categories"][feature]] \
+                    + passthrough
+
+    # second pass, write the rows and merge the Normalization statistics of each chunk (Chan et al.)
+    features = np.lib.format.open_memmap(features_file + ".tmp.npy", mode="w+", dtype=np.float32, shape=(n_rows, len(meta["columns"])))
+    labels = np.lib.format.open_memmap(labels_file + ".tmp.npy", mode="w+", dtype=np.float32, shape=(n_rows,))
+    mean = np.zeros(len(meta["columns"]))
+    square_deviation = np.zeros(len(meta["columns"]))             # sum of squared deviations from mean
+    row = 0
+    for chunk in csv_chunks(file_name):
+        encoded = encode_rows(chunk, meta)
+        features[row:row + len(chunk)] = encoded
+        labels[row:row + len(chunk)] = chunk[label_column].to_numpy(dtype=np.float32)
+        mean, square_deviation = merge_moments(mean, square_deviation, row, encoded.astype(np.float64))
+        row += len(chunk)
+    features.flush()
+    labels.flush()
+    del features, labels
+
+    meta["mean"] = mean.tolist()
+    meta["variance"] = (square_deviation / max(n_rows, 1)).tolist()
+
+    os.replace(features_file + ".tmp.npy", features_file)          # an interrupted build never looks finished
+    os.replace(labels_file + ".tmp.npy", labels_file)
+    np.save(media_file(file_name), np.concatenate(media).astype(str) if media else np.array([], dtype=str))   # fixed width text, no pickle
+    with open(meta_file + ".tmp", "w") as f:
+        json.dump(meta, f, indent=1)
+    os.replace(meta_file + ".tmp", meta_file)                       # written last, marks the store complete
+    return meta
+
+
+def read_meta(file_name=data_file):
+    """Store metadata, or None if the store is missing or older than the csv."""
+    meta_file = store_files(file_name)[2]
+    if os.path.isfile(meta_file) == False:
+        return None
+    with open(meta_file) as f:
+        meta = json.load(f)
+    if meta["key"] != store_key(file_name):
+        return None
+    return meta
+
+
+def load_feature_store(file_name=data_file):
+    """Returns the memory mapped features and labels and the metadata, building the store if needed."""
+    meta = read_meta(file_name)
+    if meta is None:
+        meta = build_feature_store(file_name)
+    features_file, labels_file, meta_file = store_files(file_name)
+    return np.load(features_file, mmap_mode="r"), np.load(labels_file, mmap_mode="r"), meta
+
+
+def load_media(file_name=data_file):
+    """Media name of every row of the store."""
+    load_feature_store(file_name)
+    return np.load(media_file(file_name))
+
+
+def main():
+    file_name = sys.argv[1] if len(sys.argv) > 1 else data_file
+    meta = build_feature_store(file_name)
+    print("{} rows x {} columns stored for {}".format(meta["rows"], len(meta["columns"]), file_name))
+
+
+if __name__ == "__main__":
+    main()
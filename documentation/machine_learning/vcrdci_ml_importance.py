@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""vcrdci123 permutation feature importance
+
+How much each input feature contributes to a trained model: the test set RMSE after shuffling one
+feature column, minus the RMSE of the unshuffled test set.  The model is a .npz exported with
+vcrdci_ml_export.py and is scored with vcrdci_ml_numpy_model.py, so TensorFlow is not needed.
+The permuted copies of the test matrix (one per feature) are stacked into one batch, up to
+max_batch_rows rows, and scored with one predict call.  The repeats, each with different
+permutations, are scored in importance_workers processes.
+    python vcrdci_ml_importance.py <model .npz> [store column numbers of the model inputs]
+The column numbers default to the ones saved with the model, or all store columns.
+"""
+
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import numpy as np
+from sklearn.model_selection import train_test_split
+
+from vcrdci_ml_feature_store import load_feature_store
+from vcrdci_ml_numpy_model import load_model, predict
+
+
+importance_repeats = 5          # permutations per feature
+importance_workers = 5          # repeats scored at the same time
+max_batch_rows = 4000000        # rows of permuted copies scored in one call
+importance_file = "vcrdci123_importance.csv"
+
+
+def rmse(labels, predictions):
+    return np.sqrt(np.mean((predictions - labels) ** 2, axis=-1))
+
+
+def pearson(labels, predictions):
+    labels = labels - labels.mean()
+    predictions = predictions - predictions.mean(axis=-1, keepdims=True)
+    return (predictions @ labels) / np.sqrt(np.sum(predictions ** 2, axis=-1) * (labels @ labels))
+
+
+def score_repeat(model, features, labels, seed):
+    """RMSE and Pearson correlation with each column permuted, for one set of permutations."""
+    n_rows, n_columns = features.shape
+    rng = np.random.default_rng(seed)
+    chunk_columns = max(1, max_batch_rows // n_rows)
+    rmse_values = np.empty(n_columns)
+    pearson_values = np.empty(n_columns)
+    for first in range(0, n_columns, chunk_columns):
+        columns = range(first, min(first + chunk_columns, n_columns))
+        copies = np.repeat(features[None, :, :], len(columns), axis=0)          # one copy of the test matrix per column
+        for copy, column in enumerate(columns):
+            copies[copy, :, column] = features[rng.permutation(n_rows), column]
+        predictions = predict(model, copies.reshape(-1, n_columns)).reshape(len(columns), n_rows)
+        rmse_values[first:first + len(columns)] = rmse(labels, predictions)
+        pearson_values[first:first + len(columns)] = pearson(labels, predictions)
+    return rmse_values, pearson_values
+
+
+def permutation_importance(model, features, labels, names):
+    features = np.asarray(features, dtype=np.float32)
+    labels = np.asarray(labels, dtype=np.float64)
+    baseline = predict(model, features)
+    baseline_rmse = float(rmse(labels, baseline))
+    baseline_pearson = float(pearson(labels, baseline[None, :])[0])
+
+    with ProcessPoolExecutor(max_workers=importance_workers) as pool:
+        repeats = list(pool.map(score_repeat, [model] * importance_repeats, [features] * importance_repeats,
+                                [labels] * importance_repeats, range(importance_repeats)))
+    rmse_increase = np.array([rmse_values for rmse_values, pearson_values in repeats]) - baseline_rmse
+    pearson_drop = baseline_pearson - np.array([pearson_values for rmse_values, pearson_values in repeats])
+
+    importance = pd.DataFrame({
+        "feature": names,
+        "rmse_increase": rmse_increase.mean(axis=0),
+        "rmse_increase_std": rmse_increase.std(axis=0),
+        "pearson_drop": pearson_drop.mean(axis=0),
+        "pearson_drop_std": pearson_drop.std(axis=0),
+    })
+    print("Baseline RMSE {:.3f}, Pearson {:.3f}".format(baseline_rmse, baseline_pearson))
+    return importance.sort_values("rmse_increase", ascending=False, ignore_index=True)
+
+
+def main():
+    model = load_model(sys.argv[1])
+    features, labels, meta = load_feature_store()
+    if len(sys.argv) > 2:
+        columns = [int(index) for index in sys.argv[2:]]
+    elif model["columns"] is not None:
+        columns = [int(index) for index in model["columns"]]
+    else:
+        columns = list(range(features.shape[1]))
+
+    # test rows of the examples' train_test_split
+    train_rows, test_rows = train_test_split(np.arange(len(labels)), test_size = 0.2, random_state = 1)
+    test_rows = np.sort(test_rows)
+    importance = permutation_importance(model, features[test_rows][:, columns], labels[test_rows],
+                                        [meta["columns"][column] for column in columns])
+    importance.to_csv(importance_file, index=False)
+    print(importance.to_string(index=False))
+    print("importance written to", importance_file)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""vcrdci123 streaming input pipeline
+
+Feeds rows of the memory mapped feature store (vcrdci_ml_feature_store.py) to Keras as a tf.data
+pipeline, so the whole feature table trains without copying it into arrays first.  For training,
+rows are read in blocks of block_rows in file order; the block order is shuffled every epoch, the
+rows of consecutive blocks are mixed in a buffer of shuffle_rows, and batches are prefetched while
+the current batch trains.  Features are normalized with the mean and variance kept in the store.
+"""
+
+import numpy as np
+import tensorflow as tf
+from sklearn.model_selection import train_test_split
+
+
+block_rows = 4096           # rows read from the memory map at a time
+shuffle_rows = 16384        # rows in the shuffle buffer
+batch_size = 64
+
+
+def split_rows(n_rows, test_size=0.2, random_state=1):
+    """Row numbers of the training and test set, the same split train_test_split makes of the data."""
+    train_rows, test_rows = train_test_split(np.arange(n_rows), test_size=test_size, random_state=random_state)
+    return train_rows, test_rows
+
+
+def validation_rows(train_rows, validation_split=0.2):
+    """The last validation_split of the training rows are for validation, as fit(validation_split=...)."""
+    split_at = int(np.floor(len(train_rows) * (1.0 - validation_split)))
+    return train_rows[:split_at], train_rows[split_at:]
+
+
+def normalization_stats(meta, columns=None):
+    """Mean and standard deviation of the columns, as tf.keras.layers.Normalization adapted to the store."""
+    columns = slice(None) if columns is None else list(columns)
+    mean = np.array(meta["mean"])[columns]
+    std = np.maximum(np.sqrt(np.array(meta["variance"])[columns]), tf.keras.backend.epsilon())
+    return mean.astype(np.float32), std.astype(np.float32)
+
+
+def read_blocks(features, labels, rows, columns, shuffle, seed):
+    rng = np.random.default_rng(seed)
+
+    def blocks():
+        starts = np.arange(0, len(rows), block_rows)
+        if shuffle:
+            rng.shuffle(starts)                             # new block order on every epoch
+        for start in starts:
+            block = rows[start:start + block_rows]
+            x = features[block]
+            if columns is not None:
+                x = x[:, columns]
+            yield x.astype(np.float32), labels[block].astype(np.float32)
+
+    return blocks
+
+
+def make_dataset(features, labels, rows, meta, columns=None, shuffle=True, seed=1):
+    """Batches of (normalized features, labels) of the rows.  Without shuffle, the rows keep their order."""
+    rows = np.sort(rows) if shuffle else np.asarray(rows)      # sorted, each block is one region of the file
+    columns = None if columns is None else list(columns)
+    n_columns = features.shape[1] if columns is None else len(columns)
+    mean, std = normalization_stats(meta, columns)
+
+    dataset = tf.data.Dataset.from_generator(
+        read_blocks(features, labels, rows, columns, shuffle, seed),
+        output_signature=(
+            tf.TensorSpec(shape=(None, n_columns), dtype=tf.float32),
+            tf.TensorSpec(shape=(None,), dtype=tf.float32),
+        ),
+    )
+    if shuffle:
+        dataset = dataset.unbatch().shuffle(shuffle_rows, seed=seed).batch(batch_size)
+    else:
+        dataset = dataset.unbatch().batch(batch_size)
+    dataset = dataset.map(lambda x, y: ((x - mean) / std, y), num_parallel_calls=tf.data.AUTOTUNE)
+    return dataset.prefetch(tf.data.AUTOTUNE)
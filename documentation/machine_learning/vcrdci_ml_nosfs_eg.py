@@ -12,21 +12,39 @@ from sklearn.preprocessing import OneHotEncoder
 from sklearn.compose import ColumnTransformer
 from matplotlib import pyplot as plt
 
-from tensorflow.keras import backend as K
-
-
-def pearson_r(y_true, y_pred):
-    x = y_true
-    y = y_pred
-    mx = K.mean(x, axis=0)
-    my = K.mean(y, axis=0)
-    xm, ym = x - mx, y - my
-    r_num = K.sum(xm * ym)
-    x_square_sum = K.sum(xm * xm)
-    y_square_sum = K.sum(ym * ym)
-    r_den = K.sqrt(x_square_sum * y_square_sum)
-    r = r_num / r_den
-    return K.mean(r)
+
+class DatasetPearson(tf.keras.metrics.Metric):
+    """Pearson correlation of all batches seen since the last reset, not the mean of per batch values.
+
+    Keeps the count, sums, sums of squares and cross product of labels and predictions, so the value
+    logged for an epoch (or returned by evaluate) is exact for the whole dataset without another predict pass.
+    """
+
+    def __init__(self, name="pearson_r", **kwargs):
+        super().__init__(name=name, **kwargs)
+        self.stats = self.add_weight(name="stats", shape=(6,), initializer="zeros", dtype=tf.float64)
+
+    def update_state(self, y_true, y_pred, sample_weight=None):
+        x = tf.cast(tf.reshape(y_true, [-1]), tf.float64)
+        y = tf.cast(tf.reshape(y_pred, [-1]), tf.float64)
+        self.stats.assign_add(tf.stack([
+            tf.cast(tf.size(x), tf.float64),
+            tf.reduce_sum(x),
+            tf.reduce_sum(y),
+            tf.reduce_sum(x * x),
+            tf.reduce_sum(y * y),
+            tf.reduce_sum(x * y),
+        ]))
+
+    def result(self):
+        n, x_sum, y_sum, x_square_sum, y_square_sum, xy_sum = tf.unstack(self.stats)
+        covariance = xy_sum - x_sum * y_sum / n
+        x_variance = x_square_sum - x_sum * x_sum / n
+        y_variance = y_square_sum - y_sum * y_sum / n
+        return tf.cast(tf.math.divide_no_nan(covariance, tf.sqrt(x_variance * y_variance)), tf.float32)
+
+    def reset_state(self):
+        self.stats.assign(tf.zeros((6,), dtype=tf.float64))
 
 vcrdci_all_data = pd.read_csv(
     "vcrdci_123_all_data_eg_no_nans.csv",
@@ -128,7 +146,7 @@ def build_model():
     model.compile(
         optimizer="adam",
         loss=tf.keras.losses.MeanSquaredError(),
-        metrics=["mse", pearson_r],
+        metrics=["mse", DatasetPearson(), tf.keras.metrics.RootMeanSquaredError(name="rmse")],
     )
     return model
 
@@ -153,19 +171,19 @@ history = model.fit(
 hist = pd.DataFrame(history.history)
 hist['epoch'] = history.epoch
 
-val_rmse = np.sqrt(float(hist['val_mse'].min()))
-val_pearson = float(hist["val_pearson_r"].min())
-print('\nFinal Root Mean Square Error on validation set: {}'.format(round(val_rmse, 3)))
-print("Final Pearson Correlation Error on validation set: {}".format(round(val_pearson, 3)))
+# TF 2.10 restores the weights of the lowest val_loss only when EarlyStopping stops the training,
+# if all epochs run the model keeps the weights of the last epoch
+best_epoch = hist["val_loss"].idxmin() if early_stop.stopped_epoch > 0 else hist.index[-1]
+val_rmse = float(hist.loc[best_epoch, "val_rmse"])
+val_pearson = float(hist.loc[best_epoch, "val_pearson_r"])
+print("\nRoot Mean Square Error on validation set (epoch {}): {}".format(best_epoch, round(val_rmse, 3)))
+print("Pearson Correlation on validation set (epoch {}): {}".format(best_epoch, round(val_pearson, 3)))
 
 print("\nEvaluating...")
-scores = model.evaluate(feature_test, label_test, verbose=0)
-test_loss_mse, test_metric_mse, test_metric_pearson = scores
-
-test_loss_rmse = np.sqrt(test_loss_mse)
+scores = model.evaluate(feature_test, label_test, verbose=0, return_dict=True)
 
-print("Loss: RMSE on test set: {}".format(round(test_loss_rmse, 3)))
-print("Metric: Pearson on test set: {}".format(round(test_metric_pearson, 3)))
+print("RMSE on test set: {}".format(round(scores["rmse"], 3)))
+print("Pearson on test set: {}".format(round(scores["pearson_r"], 3)))
 
 def plot_history():
     plt.figure()
@@ -181,6 +199,8 @@ plot_history()
 
 # model.save("/content/vcrdci123_small_model_test", save_format="tf")
 # !zip -r vcrdci123_small_model_test.zip vcrdci123_small_model_test/
+# from vcrdci_ml_export import export_model
+# export_model(model, "vcrdci123_small_model_test.npz")  # for TensorFlow-free scoring with vcrdci_ml_numpy_model.py
 
 feature_test = pd.read_csv("feature_test_vcrdci123_small.csv")
 feature_test = np.array(feature_test)
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""vcrdci123 NumPy inference
+
+Scores feature rows with a model exported by vcrdci_ml_export.py, using only NumPy: normalization,
+then float32 matrix products and activations, batch_rows rows at a time.  To score the feature
+store (vcrdci_ml_feature_store.py) of a csv from the command line:
+    python vcrdci_ml_numpy_model.py <model .npz> [csv file]
+The predicted raw_mos of every stored row is written to <csv>.predictions.csv.  A model exported
+with its input columns (a feature subset) is given those store columns only.
+"""
+
+import sys
+
+import numpy as np
+
+
+batch_rows = 65536          # rows scored per matrix product
+
+
+def relu(x):
+    return np.maximum(x, 0, out=x)
+
+
+def linear(x):
+    return x
+
+
+def sigmoid(x):
+    return 1 / (1 + np.exp(-x))
+
+
+activation_functions = {"relu": relu, "linear": linear, "sigmoid": sigmoid, "tanh": np.tanh}   # no lambdas, a loaded model can be sent to worker processes
+
+
+def load_model(file_name):
+    with np.load(file_name, allow_pickle=False) as saved:
+        activations = [str(name) for name in saved["activations"]]
+        model = {
+            "mean": saved["mean"] if "mean" in saved.files else None,
+            "std": saved["std"] if "std" in saved.files else None,
+            "columns": saved["columns"] if "columns" in saved.files else None,
+            "layers": [(saved["kernel_" + str(n)], saved["bias_" + str(n)], activation_functions[name])
+                       for n, name in enumerate(activations)],
+        }
+    return model
+
+
+def predict_batch(model, features):
+    x = np.asarray(features, dtype=np.float32)
+    if model["mean"] is not None:
+        x = (x - model["mean"]) / model["std"]
+    for kernel, bias, activation in model["layers"]:
+        x = activation(x @ kernel + bias)
+    return x[:, 0]
+
+
+def predict(model, features, columns=None):
+    """Predictions of all rows of features (an array or a memory map), as float32.
+
+    columns selects the model inputs from the columns of features, batch by batch, so a memory
+    mapped store is never copied whole.
+    """
+    predictions = np.empty(len(features), dtype=np.float32)
+    for start in range(0, len(features), batch_rows):
+        batch = features[start:start + batch_rows]
+        predictions[start:start + batch_rows] = predict_batch(model, batch if columns is None else batch[:, columns])
+    return predictions
+
+
+def main():
+    from vcrdci_ml_feature_store import data_file, load_feature_store   # pandas only for the command line
+
+    model = load_model(sys.argv[1])
+    file_name = sys.argv[2] if len(sys.argv) > 2 else data_file
+    features, labels, meta = load_feature_store(file_name)
+    predictions = predict(model, features, model["columns"])   # the store columns of a model trained on a subset
+    np.savetxt(file_name + ".predictions.csv", np.column_stack([labels, predictions]), delimiter=",",
+               header="raw_mos,prediction", comments="", fmt="%.6f")
+    print("{} rows scored, predictions written to {}".format(len(predictions), file_name + ".predictions.csv"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""vcrdci123 parallel sequential forward selection
+
+The feature selection of vcrdci_ml_sfs_eg.py without mlxtend.  mlxtend trains the candidate
+subsets of each step one after the other (n_jobs=1).  Here the candidates of a step are trained
+at the same time in a pool of worker processes, each limited to tf_threads TensorFlow threads.
+As in vcrdci_ml_sfs_eg.py (cv=0), a subset is scored by the negative mean squared error of the
+network on the training features.  With surrogate_top_k set, a ridge regression surrogate
+(vcrdci_ml_surrogate.py) ranks all candidates of a step first and only the surrogate_top_k best
+are trained.  With halving_min_epochs set, the trained candidates go through successive halving:
+all of them train for halving_min_epochs, the worse half is dropped and the budget doubles for the
+rest, until the last candidate (or the last few) train for the full epochs.  The networks and epochs
+trained (all rungs, as measured, EarlyStopping included) are reported, with the epochs saved
+against training every candidate with the full budget: the flat budget of epochs per candidate
+minus the measured epochs (an upper bound), and an estimate from the measured epochs of the full
+budget fits.  The workers memory map the feature store (vcrdci_ml_feature_store.py) and stream it
+through vcrdci_ml_input.py, so they share one copy of the data in the page cache and the whole
+table can be searched.
+
+Every score (per subset and epoch budget) is appended to scores_file as soon as it is known.  An interrupted search is resumed
+by running the script again: subsets already in scores_file are not trained again.  Delete
+scores_file after changing the data or the network.
+"""
+
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+import numpy as np
+
+from vcrdci_ml_common import load_vcrdci, build_mlp
+from vcrdci_ml_input import split_rows, validation_rows, make_dataset
+from vcrdci_ml_surrogate import RidgeSurrogate
+
+
+sfs_workers = 4                             # networks trained at the same time
+tf_threads = 2                              # TensorFlow threads per worker, sfs_workers * tf_threads ~ number of cores
+scores_file = "vcrdci123_sfs_scores.csv"    # score of every trained subset
+max_features = None                         # stop the search at this many features, None for all
+surrogate_top_k = 5                         # candidates per step trained after the ridge pre-screen, None trains all
+surrogate_ridge = 1.0                       # ridge penalty of the surrogate
+halving_min_epochs = 125                    # first successive halving budget, None trains every candidate for epochs
+epochs = 1000
+
+worker_data = {}
+
+
+def init_worker(train_rows, threads):
+    import tensorflow as tf
+
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+    features, labels, meta = load_vcrdci()                          # memory mapped, not copied into the worker
+    worker_data.update(features=features, labels=labels, meta=meta, train_rows=train_rows)
+
+
+def score_subset(subset, budget):
+    import tensorflow as tf
+
+    features, labels, meta = worker_data["features"], worker_data["labels"], worker_data["meta"]
+    train_rows = worker_data["train_rows"]
+    fit_rows, val_rows = validation_rows(train_rows)
+
+    tf.keras.backend.clear_session()
+    model = build_mlp(len(subset))
+    early_stop = tf.keras.callbacks.EarlyStopping(monitor="val_loss", patience=100, restore_best_weights=True)
+    history = model.fit(
+        make_dataset(features, labels, fit_rows, meta, columns=subset),
+        validation_data=make_dataset(features, labels, val_rows, meta, columns=subset, shuffle=False),
+        epochs=budget,
+        callbacks=[early_stop],
+        verbose=0,
+    )
+    predictions = model.predict(make_dataset(features, labels, train_rows, meta, columns=subset, shuffle=False), verbose=0)[:, 0]
+    return subset, budget, -float(np.mean((labels[train_rows] - predictions) ** 2)), len(history.epoch)
+
+
+def subset_key(subset):
+    return " ".join(str(index) for index in subset)
+
+
+def read_scores():
+    if os.path.isfile(scores_file) == False:
+        return {}
+    scores = pd.read_csv(scores_file, dtype={"subset": str})
+    if "budget" not in scores.columns:                             # written before successive halving, full budget
+        scores["budget"] = epochs
+    return {(tuple(int(index) for index in key.split()), budget): (score, trained_epochs)
+            for key, budget, score, trained_epochs in zip(scores["subset"], scores["budget"], scores["score"], scores["epochs"])}
+
+
+def record_score(subset, budget, score, trained_epochs):
+    new_file = os.path.isfile(scores_file) == False
+    with open(scores_file, "a") as f:
+        if new_file:
+            f.write("subset,budget,score,epochs\n")
+        f.write("{},{},{},{}\n".format(subset_key(subset), budget, score, trained_epochs))
+
+
+def halving_budgets():
+    if halving_min_epochs is None:
+        return [epochs]
+    budgets = []
+    budget = halving_min_epochs
+    while budget < epochs:
+        budgets.append(budget)
+        budget *= 2
+    return budgets + [epochs]
+
+
+def evaluate(pool, scores, subsets, budget):
+    """Train the subsets without a score for budget, returns the epochs trained (measured) for all subsets."""
+    futures = [pool.submit(score_subset, subset, budget) for subset in subsets if (subset, budget) not in scores]
+    for future in as_completed(futures):
+        subset, budget, score, trained_epochs = future.result()
+        scores[(subset, budget)] = (score, trained_epochs)
+        record_score(subset, budget, score, trained_epochs)
+    return sum(scores[(subset, budget)][1] for subset in subsets)
+
+
+def select_candidate(pool, scores, candidates):
+    """Successive halving over the candidates.
+
+    Returns the winner, its full budget score, the networks trained in all rungs, the epochs they
+    trained and the epochs of each full budget fit.
+    """
+    budgets = halving_budgets()
+    survivors = candidates
+    fits = 0
+    trained_epochs = 0
+    for budget in budgets[:-1]:
+        if len(survivors) == 1:
+            break
+        fits += len(survivors)
+        trained_epochs += evaluate(pool, scores, survivors, budget)
+        ranked = sorted(survivors, key=lambda subset: -scores[(subset, budget)][0])   # stable, first candidate wins a tie
+        survivors = ranked[:(len(survivors) + 1) // 2]
+
+    fits += len(survivors)
+    trained_epochs += evaluate(pool, scores, survivors, epochs)
+    best = max(survivors, key=lambda subset: scores[(subset, epochs)][0])
+    return best, scores[(best, epochs)][0], fits, trained_epochs, [scores[(subset, epochs)][1] for subset in survivors]
+
+
+def forward_select(features, labels, train_rows):
+    """Returns the best subset of each size as a list of (subset, score)."""
+    scores = read_scores()
+    n_features = features.shape[1]
+    n_select = n_features if max_features is None else min(max_features, n_features)
+    print(len(scores), "subset scores read from", scores_file)
+
+    surrogate = RidgeSurrogate(features, labels, ridge=surrogate_ridge, rows=train_rows)
+    selected = ()
+    steps = []
+    candidate_count = 0
+    screened = 0
+    fits = 0
+    trained_epochs = 0
+    full_budget_epochs = []
+    context = multiprocessing.get_context("spawn")                 # TensorFlow is not fork safe
+    with ProcessPoolExecutor(max_workers=sfs_workers, mp_context=context,
+                             initializer=init_worker, initargs=(train_rows, tf_threads)) as pool:
+        while len(selected) < n_select:
+            remaining = surrogate.top_k([index for index in range(n_features) if index not in selected], surrogate_top_k)
+            candidates = [tuple(sorted(selected + (index,))) for index in remaining]
+            screened += n_features - len(selected)
+            candidate_count += len(candidates)
+            best, score, step_fits, step_epochs, step_full = select_candidate(pool, scores, candidates)   # a resumed search takes the same path
+            fits += step_fits
+            trained_epochs += step_epochs
+            full_budget_epochs += step_full
+            surrogate.add(next(index for index in best if index not in selected))
+            selected = best
+            steps.append((selected, score))
+            print("{} features: {:.2f} {}".format(len(selected), score, selected))
+    print("{} candidates trained out of {} screened subsets, {} networks in all halving rungs (resumed scores included)".format(
+        candidate_count, screened, fits))
+    if candidate_count > 0:
+        estimate = candidate_count * np.mean(full_budget_epochs)           # full budget fits stop early too
+        flat_budget = candidate_count * epochs
+        print("{} epochs trained (measured), {} epochs saved against the flat budget of {} epochs per candidate "
+              "({} epochs)".format(trained_epochs, flat_budget - trained_epochs, epochs, flat_budget))
+        print("about {:.0f} epochs saved against full budget fits of every candidate that stop early as the {} "
+              "measured ones".format(estimate - trained_epochs, len(full_budget_epochs)))
+    return steps
+
+
+def main():
+    vcrdci_all_features, vcrdci_all_labels, meta = load_vcrdci()
+    train_rows, test_rows = split_rows(len(vcrdci_all_labels))
+
+    steps = forward_select(vcrdci_all_features, vcrdci_all_labels, train_rows)
+    best_subset, best_score = max(steps, key=lambda step: step[1])
+    print("Best accuracy score: %.2f" % best_score)
+    print("Best subset (indices):", best_subset)
+
+
+if __name__ == "__main__":
+    main()
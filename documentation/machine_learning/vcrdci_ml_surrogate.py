@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""Ridge regression surrogate for sequential forward selection
+
+Scores every candidate subset of a forward step with a closed-form ridge regression instead of
+training a network.  The Gram matrix of the features is computed once.  For the selected subset S
+the inverse of (X_S'X_S + ridge*I) is kept and grown by one row and column per step (bordered
+inverse), so all candidates S + {j} of a step are scored with a few matrix products.  The features are
+centered and scaled to unit variance, and the Gram matrix is summed up over blocks of rows, so
+a memory mapped feature matrix is never copied whole:
+
+    d_j = x_j'x_j + ridge - u_j' A^-1 u_j      with u_j = X_S'x_j
+    c_j = x_j'y - u_j' A^-1 X_S'y
+    SSE(S + {j}) = SSE(S) - c_j^2 / d_j
+
+vcrdci_ml_sfs_parallel.py trains networks only for the surrogate's best candidates.
+"""
+
+import numpy as np
+
+
+block_rows = 65536          # rows summed up at a time
+
+
+class RidgeSurrogate(object):
+    def __init__(self, X, y, ridge=1.0, rows=None):
+        rows = np.arange(len(y)) if rows is None else np.sort(rows)
+        n = len(rows)
+        gram = np.zeros((X.shape[1], X.shape[1]))
+        xty = np.zeros(X.shape[1])
+        column_sum = np.zeros(X.shape[1])
+        label_sum = 0.0
+        label_square_sum = 0.0
+        for start in range(0, n, block_rows):
+            block = rows[start:start + block_rows]
+            X_block = np.asarray(X[block], dtype=np.float64)
+            y_block = np.asarray(y[block], dtype=np.float64)
+            gram += X_block.T @ X_block
+            xty += X_block.T @ y_block
+            column_sum += X_block.sum(axis=0)
+            label_sum += y_block.sum()
+            label_square_sum += y_block @ y_block
+
+        mean = column_sum / n                   # centered, so the intercept needs no column
+        label_mean = label_sum / n
+        gram -= n * np.outer(mean, mean)
+        xty -= n * mean * label_mean
+        scale = np.maximum(np.sqrt(np.maximum(np.diag(gram), 0) / n), 1e-7)   # unit variance, as the normalized network inputs
+        self.ridge = ridge
+        self.n_samples = n
+        self.gram = gram / np.outer(scale, scale)
+        self.xty = xty / scale
+        self.sse = float(label_square_sum - n * label_mean ** 2)   # SSE of the empty subset
+        self.selected = []
+        self.inverse = np.zeros((0, 0))
+
+    def screen(self, candidates):
+        """Ridge cost (squared error plus penalty) per sample of selected + [j], for every j in candidates."""
+        candidates = list(candidates)
+        U = self.gram[np.ix_(self.selected, candidates)]
+        W = self.inverse @ U
+        d = self.gram[candidates, candidates] + self.ridge - np.sum(U * W, axis=0)
+        c = self.xty[candidates] - W.T @ self.xty[self.selected]
+        return (self.sse - c ** 2 / d) / self.n_samples
+
+    def add(self, index):
+        """Add one feature to the selected subset, bordered update of the inverse."""
+        u = self.gram[self.selected, index]
+        w = self.inverse @ u
+        d = self.gram[index, index] + self.ridge - u @ w
+        c = self.xty[index] - w @ self.xty[self.selected]
+
+        size = len(self.selected)
+        inverse = np.empty((size + 1, size + 1))
+        inverse[:size, :size] = self.inverse + np.outer(w, w) / d
+        inverse[:size, size] = -w / d
+        inverse[size, :size] = -w / d
+        inverse[size, size] = 1 / d
+        self.inverse = inverse
+        self.sse -= c ** 2 / d
+        self.selected.append(index)
+
+    def top_k(self, candidates, k):
+        """The k candidates with the lowest surrogate error, in the order of candidates."""
+        candidates = list(candidates)
+        if k is None or k >= len(candidates):
+            return candidates
+        keep = np.sort(np.argsort(self.screen(candidates), kind="stable")[:k])
+        return [candidates[index] for index in keep]
@@ -0,0 +1,168 @@
+############################################################################################
+# Program Name : MAT-file Reader
+# Description  : Reads single fields of MATLAB .mat files, such as the dataset structures
+#                   (vqa_broadcast.mat) and NRpars files, without loading the rest.
+#                   v7.3 files are HDF5 and are opened lazily with h5py: only the
+#                   requested field, or one row of it, is read from disk. h5py is
+#                   imported only when a v7.3 file is opened. Older files (v4, v5, v7)
+#                   are read with scipy.io.loadmat, which loads only the requested
+#                   top level variable.
+############################################################################################
+
+import numpy as np
+import scipy
+import scipy.io
+
+HDF5Signature = b"\x89HDF\r\n\x1a\n"
+NumericClasses = [ "double", "single", "int8", "int16", "int32", "int64", "uint8", "uint16", "uint32", "uint64" ]
+
+# mat_version
+#   Version of a .mat file
+# SYNTAX
+#   version = mat_version(mat_file)
+# SEMANTICS
+#   Returns "7.3" for HDF5 based files, "5" for v5 and v7 files (same
+#   format, v7 is compressed) and "4" for files without the v5 text header.
+#
+def mat_version(mat_file):
+    with open(mat_file, "rb") as f:
+        header = f.read(128)
+        f.seek(512)
+        signature = f.read(8)
+    if signature == HDF5Signature:
+        return "7.3"
+    if header.startswith(b"MATLAB 5.0 MAT-file") or header[124:128] in (b"\x00\x01IM", b"\x01\x00MI"):
+        return "5"
+    return "4"
+
+# MatFile
+#   Read fields of a .mat file
+# SYNTAX
+#   with MatFile(mat_file) as mat:
+#       value = mat.read(path)
+#       row   = mat.read_row(path, row)
+# SEMANTICS
+#   path is a variable name followed by field names, separated by dots,
+#   for example "NRpars.par_name" or "ccriq_dataset.media.mos". A field of a
+#   struct array returns a list with the field of every element.
+#   Values are returned like loadmat(..., squeeze_me=True): text as str,
+#   cell arrays as lists, numeric and logical arrays as squeezed numpy arrays.
+#   read(path, squeeze=False) keeps the MATLAB shape of numeric and logical
+#   arrays, as load() and loadmat(...) without squeeze_me, for both versions.
+#   read_row returns row "row" (0 based) of a 2-D array, such as one
+#   parameter of NRpars.data, or element "row" of a struct array field;
+#   for v7.3 files only that row is read from disk. Opening a v7.3 file
+#   raises ImportError if h5py is not installed.
+#
+class MatFile:
+    def __init__(self, mat_file):
+        self.mat_file = mat_file
+        self.version = mat_version(mat_file)
+        self.h5py = None
+        self.h5 = None
+        if self.version == "7.3":
+            try:
+                import h5py
+            except ImportError:
+                raise ImportError("\"{0}\" is a v7.3 (HDF5) MAT-file, h5py is needed to read it".format(mat_file))
+            self.h5py = h5py
+            self.h5 = h5py.File(mat_file, "r")
+        self.variables = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self.h5 is not None:
+            self.h5.close()
+            self.h5 = None
+        self.variables = {}
+
+    def read(self, path, squeeze=True):
+        if self.h5 is not None:
+            return self.convert(self.find(path), squeeze)
+        return self.navigate(path, squeeze)
+
+    def read_row(self, path, row):
+        if self.h5 is None:
+            value = self.navigate(path, squeeze=False)              # keeps the rows of an array with a single column
+            if isinstance(value, list):
+                return self.navigate(path)[row]
+            return np.atleast_2d(value)[row]
+        node = self.find(path)
+        if node.dtype == self.h5py.ref_dtype:
+            refs = node[()].T.reshape(-1, order="F")              # element "row" of a struct array field or cell array
+            return self.convert(self.h5[refs[row]])
+        # MATLAB arrays are stored transposed, row "row" in MATLAB is column "row" in HDF5
+        return self.convert_array(node, node[:, row] if len(node.shape) == 2 else node[row])
+
+    # v5 and older, loadmat of one top level variable
+    #   squeeze=False keeps the MATLAB shape of numeric arrays, single structs
+    #   are still unwrapped as with squeeze_me=True
+    def navigate(self, path, squeeze=True):
+        names = path.split(".")
+        if (names[0], squeeze) not in self.variables:
+            loaded = scipy.io.loadmat(self.mat_file, variable_names=[names[0]], squeeze_me=squeeze, struct_as_record=False)
+            if names[0] not in loaded:
+                raise KeyError("variable \"{0}\" not in \"{1}\"".format(names[0], self.mat_file))
+            self.variables[(names[0], squeeze)] = loaded[names[0]]
+        value = self.variables[(names[0], squeeze)]
+        for name in names[1:]:
+            if squeeze == False and isinstance(value, np.ndarray) and value.dtype == object and value.size == 1:
+                value = value.reshape(-1)[0]
+            if isinstance(value, np.ndarray) and value.dtype == object:
+                value = [ getattr(element, name) for element in value.reshape(-1) ]
+            elif isinstance(value, list):
+                value = [ getattr(element, name) for element in value ]
+            else:
+                value = getattr(value, name)
+        if isinstance(value, np.ndarray) and value.dtype == object:
+            value = [ element for element in value.reshape(-1) ]
+        return value
+
+    # v7.3, HDF5 objects
+    def find(self, path):
+        node = self.h5
+        for name in path.split("."):
+            if not isinstance(node, self.h5py.Group) or name not in node:
+                raise KeyError("field \"{0}\" of \"{1}\" not in \"{2}\"".format(name, path, self.mat_file))
+            node = node[name]
+        return node
+
+    def convert(self, node, squeeze=True):
+        matlab_class = node.attrs.get("MATLAB_class", b"")
+        matlab_class = matlab_class.decode() if isinstance(matlab_class, bytes) else str(matlab_class)
+        if isinstance(node, self.h5py.Group):
+            if matlab_class not in ("struct", ""):
+                raise NotImplementedError("MATLAB class \"{0}\" cannot be read".format(matlab_class))
+            return { name: self.convert(node[name], squeeze) for name in node.keys() }
+        if node.dtype == self.h5py.ref_dtype:                      # cell array, or field of a struct array
+            refs = node[()].T.reshape(-1, order="F")
+            return [ self.convert(self.h5[ref], squeeze) for ref in refs ]
+        return self.convert_array(node, node[()], squeeze)
+
+    def convert_array(self, node, data, squeeze=True):
+        matlab_class = node.attrs.get("MATLAB_class", b"")
+        matlab_class = matlab_class.decode() if isinstance(matlab_class, bytes) else str(matlab_class)
+        if node.attrs.get("MATLAB_empty", 0):
+            return "" if matlab_class == "char" else (np.array([]) if squeeze else np.zeros((0, 0)))
+        data = np.asarray(data).T
+        if matlab_class == "char":
+            return "".join(chr(code) for code in data.reshape(-1, order="F"))
+        if matlab_class == "logical":
+            return np.squeeze(data.astype(np.bool_)) if squeeze else data.astype(np.bool_)
+        if matlab_class in NumericClasses:
+            return np.squeeze(data) if squeeze else data
+        raise NotImplementedError("MATLAB class \"{0}\" cannot be read".format(matlab_class))
+
+# read_field
+#   Read one field of a .mat file
+# SYNTAX
+#   value = read_field(mat_file, path, squeeze = True)
+#
+def read_field(mat_file, path, squeeze = True):
+    with MatFile(mat_file) as mat:
+        return mat.read(path, squeeze)
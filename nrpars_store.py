@@ -0,0 +1,211 @@
+############################################################################################
+# Program Name : NRpars Store
+# Description  : Consolidates the NRpars files written by calculate_NRpars.m
+#                   (<data_dir>/group_<name>/NRpars_<group>_<dataset>.mat) into one
+#                   columnar, memory mapped store, for fast queries across groups,
+#                   datasets and parameters from Python.
+############################################################################################
+
+import os
+import sys
+import json
+import numpy as np
+import pandas as pd
+from mat_reader import MatFile
+
+# Store files, in <data_dir>/<StoreName>
+#   values.npy      float64, one row per (NRpars file, par_name, media_name)
+#   computed.npy    bool, NRpars.computed of the row's media
+#   dataset.npy     int32 code of the dataset name
+#   media.npy       int32 code of the media name
+#   group.npy       int32 code of the group
+#   par.npy         int32 code of the parameter name
+#   index.json      names of the codes, and the rows, size and modification time of each NRpars file
+StoreName   = "nrpars_store"
+ColumnNames = [ "values", "computed", "dataset", "media", "group", "par" ]
+CodeNames   = [ "dataset", "media", "group", "par" ]
+ColumnTypes = { "values": np.float64, "computed": np.bool_, "dataset": np.int32, "media": np.int32, "group": np.int32, "par": np.int32 }
+
+# read_nrpars
+#   Read one NRpars file
+# SYNTAX
+#   nrpars = read_nrpars(mat_file)
+# SEMANTICS
+#   Returns a dictionary with the fields of the NRpars structure:
+#   par_name (list), media_name (list), data (par_name x media_name
+#   float64 array), computed (bool array) and dataset_name. Reads v7.3
+#   (HDF5) NRpars files as well as older ones.
+#
+def read_nrpars(mat_file):
+    with MatFile(mat_file) as mat:
+        par_name   = [ str(name) for name in np.atleast_1d(mat.read("NRpars.par_name")) ]
+        media_name = [ str(name) for name in np.atleast_1d(mat.read("NRpars.media_name")) ]
+        return {
+            "par_name"    : par_name,
+            "media_name"  : media_name,
+            "data"        : np.asarray(mat.read("NRpars.data"), dtype=np.float64).reshape(len(par_name), len(media_name)),
+            "computed"    : np.atleast_1d(np.asarray(mat.read("NRpars.computed"), dtype=np.bool_)).reshape(len(media_name)),
+            "dataset_name": str(mat.read("NRpars.dataset_name")),
+        }
+
+# find_nrpars_files
+#   List the NRpars files under data_dir
+# SYNTAX
+#   files = find_nrpars_files(data_dir)
+# SEMANTICS
+#   Returns a dictionary of file path (relative to data_dir) to
+#   (group, size, modification time) for every group_<name>/NRpars_*.mat
+#
+def find_nrpars_files(data_dir):
+    files = {}
+    with os.scandir(data_dir) as folders:
+        for folder in folders:
+            if not (folder.is_dir() and folder.name.startswith("group_")):
+                continue
+            with os.scandir(folder.path) as entries:
+                for entry in entries:
+                    if entry.name.startswith("NRpars_") and entry.name.endswith(".mat") and entry.is_file():
+                        stat = entry.stat()
+                        files[folder.name + "/" + entry.name] = (folder.name[len("group_"):], stat.st_size, stat.st_mtime_ns)
+    return files
+
+# encode
+#   Codes of names, adding new names to the end of the code list
+#
+def encode(names, code_list, code_dict):
+    codes = np.empty(len(names), dtype=np.int32)
+    for index, name in enumerate(names):
+        if name not in code_dict:
+            code_dict[name] = len(code_list)
+            code_list.append(name)
+        codes[index] = code_dict[name]
+    return codes
+
+# read_index
+#   Read index.json of a store, or an empty index if there is no store
+#
+def read_index(store_dir):
+    index_file = os.path.join(store_dir, "index.json")
+    if not os.path.isfile(index_file):
+        return { "codes": { name: [] for name in CodeNames }, "files": {} }
+    with open(index_file) as f:
+        return json.load(f)
+
+# refresh_store
+#   Bring the store of data_dir up to date with its NRpars files
+# SYNTAX
+#   refresh_store(data_dir, verbose = True)
+# SEMANTICS
+#   NRpars files with the same size and modification time as when they were
+#   stored are copied from the old store, only new or changed files are read.
+#   Rows of deleted files are dropped. Code lists only grow, so the codes of
+#   unchanged rows stay valid. Returns the number of files read.
+#
+def refresh_store(data_dir, verbose = True):
+    store_dir = os.path.join(data_dir, StoreName)
+    os.makedirs(store_dir, exist_ok=True)
+    index = read_index(store_dir)
+    old_columns = { name: np.load(os.path.join(store_dir, name + ".npy"), mmap_mode="r") for name in ColumnNames } \
+                  if len(index["files"]) > 0 else None
+    code_lists = index["codes"]
+    code_dicts = { name: { value: code for code, value in enumerate(code_lists[name]) } for name in CodeNames }
+
+    segments = []
+    new_files = {}
+    read_count = 0
+    row_count = 0
+    for file, (group, size, mtime) in sorted(find_nrpars_files(data_dir).items()):
+        old = index["files"].get(file)
+        if old is not None and old["size"] == size and old["mtime"] == mtime:
+            segment = { name: old_columns[name][old["start"]:old["stop"]] for name in ColumnNames }
+        else:
+            try:
+                nrpars = read_nrpars(os.path.join(data_dir, file))
+            except (OSError, KeyError, ValueError, NotImplementedError) as e:
+                print("  <Failed to read NRpars file \"{0}\": {1}>".format(file, e))
+                continue
+            read_count += 1
+            n_pars, n_media = nrpars["data"].shape
+            segment = {
+                "values"  : nrpars["data"].reshape(-1),                              # all media of the first par_name, then the next
+                "computed": np.tile(nrpars["computed"], n_pars),
+                "dataset" : np.full(n_pars * n_media, encode([nrpars["dataset_name"]], code_lists["dataset"], code_dicts["dataset"])[0], dtype=np.int32),
+                "media"   : np.tile(encode(nrpars["media_name"], code_lists["media"], code_dicts["media"]), n_pars),
+                "group"   : np.full(n_pars * n_media, encode([group], code_lists["group"], code_dicts["group"])[0], dtype=np.int32),
+                "par"     : np.repeat(encode(nrpars["par_name"], code_lists["par"], code_dicts["par"]), n_media),
+            }
+        new_files[file] = { "group": group, "size": size, "mtime": mtime, "start": row_count, "stop": row_count + len(segment["values"]) }
+        row_count += len(segment["values"])
+        segments.append(segment)
+
+    # write each column to a temporary file, then replace the store
+    for name in ColumnNames:
+        column = np.concatenate([ segment[name] for segment in segments ]) if len(segments) > 0 else np.empty(0, dtype=ColumnTypes[name])
+        np.save(os.path.join(store_dir, name + ".tmp.npy"), column.astype(ColumnTypes[name], copy=False))
+    old_columns = None
+    segments = None
+    if os.path.isfile(os.path.join(store_dir, "index.json")):
+        os.remove(os.path.join(store_dir, "index.json"))           # an interrupted refresh leaves no index, the next one reads all files
+    for name in ColumnNames:
+        os.replace(os.path.join(store_dir, name + ".tmp.npy"), os.path.join(store_dir, name + ".npy"))
+    with open(os.path.join(store_dir, "index.tmp.json"), "w") as f:
+        json.dump({ "codes": code_lists, "files": new_files }, f)
+    os.replace(os.path.join(store_dir, "index.tmp.json"), os.path.join(store_dir, "index.json"))
+
+    if verbose:
+        print("{0} NRpars files, {1} read, {2} rows stored in \"{3}\"".format(len(new_files), read_count, row_count, store_dir))
+    return read_count
+
+# NRparsStore
+#   Query the store of data_dir
+# SYNTAX
+#   store = NRparsStore(data_dir)
+#   table = store.query(dataset = None, media = None, group = None, par_name = None, computed_only = True)
+# SEMANTICS
+#   The columns are memory mapped. Each argument of query is a name or a list of
+#   names, None selects all. Returns a pandas DataFrame with columns dataset,
+#   media_name, group, par_name, value and computed. For a media x parameter table:
+#       table.pivot_table(index=["dataset", "media_name"], columns="par_name", values="value")
+#
+class NRparsStore:
+    def __init__(self, data_dir):
+        store_dir = os.path.join(data_dir, StoreName)
+        self.index = read_index(store_dir)
+        self.columns = { name: np.load(os.path.join(store_dir, name + ".npy"), mmap_mode="r") for name in ColumnNames }
+        self.codes = { name: np.array(self.index["codes"][name], dtype=object) for name in CodeNames }
+
+    def mask(self, column, names):
+        if names is None:
+            return None
+        names = set([ names ] if isinstance(names, str) else names)
+        codes = [ code for code, name in enumerate(self.index["codes"][column]) if name in names ]
+        return np.isin(self.columns[column], codes)
+
+    def query(self, dataset = None, media = None, group = None, par_name = None, computed_only = True):
+        selected = np.ones(len(self.columns["values"]), dtype=np.bool_)
+        for column, names in [ ("dataset", dataset), ("media", media), ("group", group), ("par", par_name) ]:
+            mask = self.mask(column, names)
+            if mask is not None:
+                selected &= mask
+        if computed_only:
+            selected &= self.columns["computed"]
+        rows = np.flatnonzero(selected)
+        return pd.DataFrame({
+            "dataset"   : self.codes["dataset"][self.columns["dataset"][rows]],
+            "media_name": self.codes["media"][self.columns["media"][rows]],
+            "group"     : self.codes["group"][self.columns["group"][rows]],
+            "par_name"  : self.codes["par"][self.columns["par"][rows]],
+            "value"     : self.columns["values"][rows],
+            "computed"  : self.columns["computed"][rows],
+        })
+
+# Main
+#   Refresh the store of a data_dir
+# SYNTAX
+#   python nrpars_store.py data_dir
+#
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python nrpars_store.py data_dir")
+        exit(0)
+    refresh_store(sys.argv[1])